@@ -0,0 +1,308 @@
+'''
+Authors: Aaron Mueller, Andrew Blair-Stanek
+Date: 24 October 2018
+Course: Natural Language Processing
+Instructor: Jason Eisner
+Assignment: HW4 -- Parsing
+'''
+# Agenda-driven A* implementation of the weighted Earley parser.
+#
+# Instead of filling the chart column by column, this parser keeps a priority queue (the "agenda") of
+# Earley items ordered by weight + an admissible estimate of the weight still needed to turn the item into
+# a complete parse, and always works on the cheapest one. An item's weight is final the first time it is
+# popped, so the parser can stop as soon as it pops a complete ROOT spanning the sentence: that is the best
+# parse. The estimate is the larger of two lower bounds (see estimate()):
+#   - the rule's remaining r.h.s. symbols at their best inside weight, plus the best outside weight of its
+#     l.h.s., i.e. the cheapest way to get from ROOT down to that l.h.s. (precomputed per symbol)
+#   - the words outside the item's span, each at the lowest weight any rule could add for it (per sentence),
+#     less those that the rule's own remaining terminals will cover, since its weight already pays for them
+# Both are consistent (an item never gets a lower priority than the items it is built from), and so is
+# their maximum. The first one keeps the parser from finishing cheap constituents that no parse could use;
+# the second keeps it from working on cheap items far from the start of a long sentence. With both, it pops
+# about a third of the items it popped with the inside weights alone on the first six wallstreet.sen
+# sentences, and parses wallstreet.sen in about a quarter of parse.py's time.
+# Prints the same weight as parse.py (up to float rounding in the last digit). When several trees have that
+# weight, the two parsers may print different ones of them, since each keeps the first derivation it finds
+# and they find them in different orders; a derivation never replaces one of the same weight. (bench.py
+# accepts such ties.)
+
+import heapq
+import argparse
+from grammar import load_grammar
+
+# This function returns, for every symbol id, the lowest weight of any subtree rooted in that symbol
+# (0 for a terminal, inf for a nonterminal that derives no string). It is the fixpoint of
+#     best[A] = min over rules A -> B C ... of  weight + best[B] + best[C] + ...
+def best_inside_weights(grammar):
+    best = [float('inf')] * grammar.num_nonterminals + [0.0] * (len(grammar.symbols) - grammar.num_nonterminals)
+    changed = True
+    while changed:
+        changed = False
+        for i_rule in range(0, grammar.num_rules):
+            weight = grammar.rules[i_rule].weight
+            for symbol in grammar.rule_rhs_ids[i_rule]:
+                weight += best[symbol]
+            lhs = grammar.rule_lhs_ids[i_rule]
+            if weight < best[lhs]:
+                best[lhs] = weight
+                changed = True
+    return best
+
+# This function returns, for every nonterminal id, the lowest weight of everything in a parse outside a
+# subtree rooted in that nonterminal (0 for ROOT, inf for a nonterminal that no parse can contain), given
+# the best inside weights of all symbols. It is the fixpoint of
+#     best[B] = min over rules A -> X1 ... B ... Xn of  best[A] + weight + the best inside weights of the Xi
+def best_outside_weights(grammar, inside):
+    best = [float('inf')] * grammar.num_nonterminals
+    if grammar.is_nonterminal("ROOT"):
+        best[grammar.symbol_ids["ROOT"]] = 0.0
+    changed = True
+    while changed:
+        changed = False
+        for i_rule in range(0, grammar.num_rules):
+            outside = best[grammar.rule_lhs_ids[i_rule]]
+            if outside == float('inf'):
+                continue
+            rhs_ids = grammar.rule_rhs_ids[i_rule]
+            total = outside + grammar.rules[i_rule].weight + sum([inside[symbol] for symbol in rhs_ids])
+            for symbol in rhs_ids:
+                if symbol < grammar.num_nonterminals and total - inside[symbol] < best[symbol]:
+                    best[symbol] = total - inside[symbol]
+                    changed = True
+    return best
+
+# This function returns, for every terminal id, the lowest weight that a parse containing the word must
+# spend on it: the lowest weight of a rule with the word on its r.h.s., divided by the number of terminals
+# there (a rule's weight is shared by the words it generates). Every subtree weighs at least the sum of
+# this over its words.
+def best_word_weights(grammar):
+    best = {}
+    for i_rule in range(0, grammar.num_rules):
+        terminals = [symbol for symbol in grammar.rule_rhs_ids[i_rule] if symbol >= grammar.num_nonterminals]
+        for symbol in terminals:
+            weight = grammar.rules[i_rule].weight / len(terminals)
+            if weight < best.get(symbol, float('inf')):
+                best[symbol] = weight
+    return best
+
+
+# This class represents the entire parser.
+# An item is a tuple (rule_index, start_index, period_index, end_index); the chart is kept in dictionaries
+# (i.e. hash tables) keyed by item.
+class AStarParser:
+    def __init__(self):
+        self.grammar = None
+        self.grammar_rules = None
+        self.completion_estimates = None # rule index -> period index -> estimated weight to finish the rule
+                                         # and get from its l.h.s. up to ROOT
+        self.word_weights = None # terminal id -> lowest weight a parse must spend on the word
+        self.terminal_credits = None # rule index -> period index -> the word weights of the rule's terminals
+                                     # after the period
+        self.word_bounds = None # i -> lowest weight a parse must spend on the words before position i
+        self.words = None
+        self.word_ids = None
+        self.agenda = None # heap of (priority, order, weight, item, horiz_backpointer, vert_backpointer)
+        self.num_pushed = 0 # pushes so far; breaks ties in the agenda in first-come first-served order
+        self.pushed = None # item -> (weight, order) of its current (lowest-weight) push
+        self.finished = None # item -> (weight, horiz_backpointer, vert_backpointer) of items already popped
+        self.waiting = None # (end_index, symbol id) -> popped items whose period is just before that symbol
+        self.completed = None # (start_index, lhs id) -> popped complete items
+        self.predicted = None # (symbol id, column) pairs whose rules have already been predicted
+        self.attached = None # (lhs id, start_index, end_index) of the constituents already attached
+        self.best_item = None # the complete ROOT item found by the last call to parse(), or None
+
+    # Read grammar rules from an external file, and precompute the A* estimates.
+    # The completion estimate for an item is the lowest weight its remaining r.h.s. symbols could possibly
+    # add, plus the lowest outside weight of its l.h.s.; it never overestimates, so the first complete ROOT
+    # popped is the best one.
+    def read_grammar_rules(self, grammar_filename):
+        self.grammar = load_grammar(grammar_filename)
+        self.grammar_rules = self.grammar.rules
+
+        best = best_inside_weights(self.grammar)
+        outside = best_outside_weights(self.grammar, best)
+        self.word_weights = best_word_weights(self.grammar)
+        self.completion_estimates = []
+        self.terminal_credits = []
+        for i_rule in range(0, self.grammar.num_rules):
+            rhs_ids = self.grammar.rule_rhs_ids[i_rule]
+            estimates = [0.0] * (len(rhs_ids) + 1)
+            credits = [0.0] * (len(rhs_ids) + 1)
+            estimates[len(rhs_ids)] = outside[self.grammar.rule_lhs_ids[i_rule]]
+            for period_index in range(len(rhs_ids) - 1, -1, -1):
+                estimates[period_index] = estimates[period_index + 1] + best[rhs_ids[period_index]]
+                credits[period_index] = credits[period_index + 1] + self.word_weights.get(rhs_ids[period_index], 0.0)
+            self.completion_estimates.append(estimates)
+            self.terminal_credits.append(credits)
+
+    # This function returns the A* estimate for an item: a lower bound on the weight still needed to turn it
+    # into a complete parse. Scanning a terminal adds no weight and leaves it unchanged, and attaching a
+    # child lowers it by at most the child's weight, which keeps it consistent.
+    def estimate(self, item):
+        rule_index, start_index, period_index, end_index = item
+        words_outside = self.word_bounds[start_index] + self.word_bounds[-1] - self.word_bounds[end_index] - \
+            self.terminal_credits[rule_index][period_index]
+        return max(self.completion_estimates[rule_index][period_index], words_outside)
+
+    # This function puts an item on the agenda, unless the item is already known with a weight at least as
+    # low (which includes every item already popped, since popped weights are final: a popped item and its
+    # backpointers never change)
+    def push(self, item, weight, horiz_backpointer, vert_backpointer):
+        if item in self.finished:
+            return
+        if item in self.pushed and self.pushed[item][0] <= weight:
+            return
+        estimate = self.estimate(item)
+        if estimate == float('inf'): # the item can never be part of a parse
+            return
+        self.pushed[item] = (weight, self.num_pushed)
+        heapq.heappush(self.agenda, (weight + estimate, self.num_pushed, weight, item,
+                                     horiz_backpointer, vert_backpointer))
+        self.num_pushed += 1
+
+    # This function advances a popped item over the symbol after its period,
+    # either a word (vert_backpointer = None) or a complete child item
+    def advance(self, item, weight, end_index, vert_backpointer):
+        rule_index, start_index, period_index = item[0], item[1], item[2]
+        horiz_backpointer = None
+        if period_index > 0: # like parse.py, keep a horizontal backpointer only when the rule is underway
+            horiz_backpointer = item
+        self.push((rule_index, start_index, period_index + 1, end_index), weight, horiz_backpointer, vert_backpointer)
+
+    # This function processes an item that is not complete: it scans the next word or predicts the next
+    # nonterminal, and attaches any already finished constituent that it is waiting for
+    def process_incomplete(self, item, weight):
+        rule_index, start_index, period_index, end_index = item
+        next_cat = self.grammar.rule_rhs_ids[rule_index][period_index]
+
+        if next_cat >= self.grammar.num_nonterminals: # scanner
+            if end_index < len(self.words) and self.word_ids[end_index] == next_cat:
+                self.advance(item, weight, end_index + 1, None)
+            return
+
+        # predictor, at most once per nonterminal and column, with the left-corner filter of parse2.py: a rule
+        # whose first r.h.s. symbol cannot start with the next word could never be finished
+        if (next_cat, end_index) not in self.predicted and end_index < len(self.words):
+            self.predicted[(next_cat, end_index)] = True
+            left_corners = self.grammar.left_corners(self.word_ids[end_index])
+            for i_rule in self.grammar.rules_by_lhs_id[next_cat]:
+                if self.grammar.rule_rhs_ids[i_rule][0] not in left_corners:
+                    continue
+                self.push((i_rule, end_index, 0, end_index), self.grammar_rules[i_rule].weight, None, None)
+
+        # attach the constituents already finished, since they will not be popped again
+        for child in self.completed.get((end_index, next_cat), []):
+            self.advance(item, weight + self.finished[child][0], child[3], child)
+
+        key = (end_index, next_cat)
+        if key not in self.waiting:
+            self.waiting[key] = []
+        self.waiting[key].append(item)
+
+    # This function processes a complete item: it attaches it to all the items waiting for it.
+    # All the complete items with the same l.h.s. and span have the same estimate, so the first one popped is
+    # the cheapest; only that one is attached, since the others could only give its customers worse derivations.
+    def process_complete(self, item, weight):
+        rule_index, start_index, period_index, end_index = item
+        lhs = self.grammar.rule_lhs_ids[rule_index]
+        if (lhs, start_index, end_index) in self.attached:
+            return
+        self.attached[(lhs, start_index, end_index)] = True
+        for customer in self.waiting.get((start_index, lhs), []):
+            self.advance(customer, self.finished[customer][0] + weight, end_index, item)
+
+        key = (start_index, lhs)
+        if key not in self.completed:
+            self.completed[key] = []
+        self.completed[key].append(item)
+
+    # This function actually parses a particular sentence
+    def parse(self, sentence):
+        self.words = sentence.split()
+        self.word_ids = self.grammar.intern_words(self.words)
+        self.agenda = []
+        self.num_pushed = 0
+        self.pushed = {}
+        self.finished = {}
+        self.waiting = {}
+        self.completed = {}
+        self.predicted = {}
+        self.attached = {}
+        self.best_item = None
+        self.word_bounds = [0.0]
+        for word_id in self.word_ids: # a word that no rule has can never be parsed: its bound is inf
+            self.word_bounds.append(self.word_bounds[-1] + self.word_weights.get(word_id, float('inf')))
+
+        root_rules = set(self.grammar.rules_for("ROOT"))
+        for i_rule in self.grammar.rules_for("ROOT"):
+            self.push((i_rule, 0, 0, 0), self.grammar_rules[i_rule].weight, None, None)
+
+        while len(self.agenda) > 0:
+            priority, order, weight, item, horiz_backpointer, vert_backpointer = heapq.heappop(self.agenda)
+            if item in self.finished or self.pushed[item][1] != order:
+                continue # a stale agenda entry, superseded by a later push of the same item
+            self.finished[item] = (weight, horiz_backpointer, vert_backpointer)
+
+            rule_index, start_index, period_index, end_index = item
+            if period_index < self.grammar.rhs_lengths[rule_index]:
+                self.process_incomplete(item, weight)
+            elif rule_index in root_rules and start_index == 0 and end_index == len(self.words):
+                self.best_item = item # early termination: nothing left on the agenda can beat this
+                return
+            else:
+                self.process_complete(item, weight)
+
+
+    # This recursive helper function prints the subtree of a finished item, in the format of parse.py
+    def print_entry(self, item):
+        gr_rule = self.grammar_rules[item[0]]
+
+        print("(" + gr_rule.lhs + " ", end="")
+
+        # construct a list of all items making up this rule, by following pointers
+        list_entries = []
+        ref_item = item
+        while ref_item is not None:
+            list_entries.append(ref_item)
+            ref_item = self.finished[ref_item][1] # horizontal backpointer
+
+        # now walk through this list printing all the of subtrees
+        index_rhs = 0
+        while len(list_entries) > 0:
+            vert_backpointer = self.finished[list_entries.pop()][2]
+            if vert_backpointer is None:
+                print(gr_rule.rhs[index_rhs], end=" ")
+            else:
+                self.print_entry(vert_backpointer)
+            index_rhs += 1
+
+        print(")", end="")
+
+
+    # This function does the actual printing
+    def print(self):
+        if self.best_item is None:
+            print("NONE")
+            return
+        self.print_entry(self.best_item)
+        print("\n" + str(self.finished[self.best_item][0]))  # print the log-2 weight, as required for HW4
+
+
+# This main function coordinates all the code to run
+def main():
+    arg_parser = argparse.ArgumentParser(usage="%(prog)s grammar.gr sentences.sen")
+    arg_parser.add_argument("grammar_filename")
+    arg_parser.add_argument("sentences_filename")
+    args = arg_parser.parse_args()
+
+    parser = AStarParser()
+    parser.read_grammar_rules(args.grammar_filename)
+
+    with open(args.sentences_filename) as sen_file:  # open .SEN file
+        for sentence in sen_file:
+            if len(sentence.strip()) > 0:
+                parser.parse(sentence)
+                parser.print()
+
+if __name__ == "__main__":
+    main() # starts execution
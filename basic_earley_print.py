@@ -31,19 +31,29 @@ class GrRule:
 
 # This class represents a single entry (i.e., the rule, the start index, and the period index)
 class Entry:
-    def __init__(self, rule_index, start_index, period_index, weight, backpointers_to_copy = None):
+    def __init__(self, rule_index, start_index, period_index, weight, backpointers = None):
         self.rule_index = rule_index
         self.start_index = start_index
         self.period_index = period_index
-        self.weight = weight
-        self.backpointers = []  # list of list of *references* to entries upon which this is built
+        self.weight = weight # the rule's weight plus the weights of the entries for the symbols left of the period
+        # *references* to the entries upon which this is built, one per symbol left of the period (None for a
+        # terminal), as a chain (earlier backpointers, last backpointer) that is None when there are none.
+        # Chains are never changed, so advancing the period just adds one link in front of the shared chain.
+        self.backpointers = backpointers
         self.debug_info = None
-        if backpointers_to_copy is None:
-            self.backpointers.append([]) # backpointers is a list of lists of references pointing back to entries
-        else: # copies over all backpointers
-            for list_backpointers in backpointers_to_copy:
-                new_backpointers = list_backpointers.copy()
-                self.backpointers.append(new_backpointers)
+        # Setting this to True means to ignore the entry in the future: a cheaper duplicate replaced it.
+        # This approach is suggested as OK on the bottom of page R-4 and top of R-5
+        self.is_null = False
+
+
+# This function returns a chain of backpointers as a list, from the first symbol of the rule to the last
+def backpointer_list(backpointers):
+    result = []
+    while backpointers is not None:
+        backpointers, backpointer = backpointers
+        result.append(backpointer)
+    result.reverse()
+    return result
 
 
 # This class represents the entire parser
@@ -73,16 +83,16 @@ class EarleyParser:
     def predictor(self, state, i_col, next_cat):
         for i_rule in range(0, len(self.grammar_rules)):
             if self.grammar_rules[i_rule].lhs == next_cat:
-                new_entry = Entry(i_rule, i_col, 0, self.grammar_rules[state.rule_index].weight)
+                new_entry = Entry(i_rule, i_col, 0, self.grammar_rules[i_rule].weight)
                 self.enqueue(new_entry, i_col, "PREDICTOR") # attempt to add new state, if not already added
 
 
     # This is the second operator in Earley (out of three), see J&M p.444
     # It puts a new completed entry in the NEXT column of the chart
     def scanner(self, state, i_col):
-        new_entry = Entry(state.rule_index, state.start_index, state.period_index+1, self.grammar_rules[state.rule_index].weight, state.backpointers)
-        for backpointer_list in new_entry.backpointers:
-            backpointer_list.append(None) # keep an empty entry for non-terminals, which is what scanner() handles
+        # keep an empty backpointer for terminals, which is what scanner() handles
+        new_entry = Entry(state.rule_index, state.start_index, state.period_index+1, state.weight,
+                          (state.backpointers, None))
         self.enqueue(new_entry, i_col +1, "SCANNER")
 
 
@@ -93,62 +103,39 @@ class EarleyParser:
         icol2 = state.start_index
         for irow2 in range(0, len(self.chart[icol2])):
             entry2 = self.chart[icol2][irow2]
+            if entry2.is_null:
+                continue # a cheaper duplicate of entry2 is in the chart, and gets its own customers
             if entry2.period_index < len(self.grammar_rules[entry2.rule_index].rhs):
                 # then this may be seeking a completion
                 possible_match = self.grammar_rules[entry2.rule_index].rhs[entry2.period_index]
                 if possible_match == match_seeking:  # if this is true, we have a "customer" to "attach"
                     weight = entry2.weight + state.weight
                     new_entry = Entry(entry2.rule_index, entry2.start_index,
-                                      entry2.period_index + 1, weight, entry2.backpointers)
-                    for backpointer_list in new_entry.backpointers:
-                        backpointer_list.append(state) # adds backpointer
+                                      entry2.period_index + 1, weight, (entry2.backpointers, state)) # adds backpointer
 
                     self.enqueue(new_entry, i_col, "ATTACH")
 
 
     # This is a crucial helper function in Earley, see J&M p.444
     # It tries to add a state to the chart a column i_col.
-    # It only adds that state if it has not already been added in i_col.
+    # It only adds that state if it has not already been added in i_col, or if it is cheaper than the one that was.
+    # An entry is never changed once it is in the chart, since other entries may already be built on it: a
+    # cheaper duplicate is added as a new entry instead, and the old one is marked is_null. The new entry is
+    # processed like any other, so the entries built on it get cheaper duplicates in turn.
     def enqueue(self, state, column, calling_function):
         tuple_version_of_state = (state.rule_index, state.start_index, state.period_index)
 
-        if tuple_version_of_state in self.states_added[column] and calling_function == "ATTACH":
+        if tuple_version_of_state in self.states_added[column]:
             existing_state = self.states_added[column][tuple_version_of_state]
-            if len(state.backpointers) > 1:
-                print("ERROR - incorrect assumption about backpointers being added")
-            
-            if existing_state.period_index == len(self.grammar_rules[existing_state.rule_index].rhs):
-                existing_weight = float('inf')
-                min_index = 0
-                for index, backpointer_list in enumerate(existing_state.backpointers):
-                    bp_weight = existing_state.weight + \
-                        sum([bp.weight for bp in backpointer_list])
-                    if bp_weight < existing_weight:
-                        existing_weight = bp_weight
-                        min_index = index
-                new_weight = state.weight + \
-                    sum([bp.weight for bp in state.backpointers[0]])
-                
-                #print("existing",self.grammar_rules[existing_state.backpointers[min_index][1].rule_index].to_string(), existing_state.backpointers[min_index][1].weight)
-                #print("new",self.grammar_rules[state.backpointers[0][1].rule_index].to_string(), state.backpointers[0][1].weight)
-                if new_weight < existing_weight:
-                    existing_state.backpointers = [state.backpointers[0]]
-                else:
-                    existing_state.backpointers = [existing_state.backpointers[min_index]]
-                
-            # existing_state.backpointers.append(state.backpointers[0])
-            
+            if state.weight >= existing_state.weight:
+                return # keep the existing derivation, which is at least as good
+            existing_state.is_null = True
+            del self.states_added[column][tuple_version_of_state]
+
             if self.print_build_info:
-                print("ADDED BACKPOINTER TO " + existing_state.debug_info)
-                for i in range(0, len(existing_state.backpointers)):
-                    print("    Backpointers List " + str(i))
-                    for bp in existing_state.backpointers[i]:
-                        if bp is not None:
-                            print("        " + bp.debug_info)
-                        else:
-                            print("        None")
-
-        elif tuple_version_of_state not in self.states_added[column]:
+                print("REPLACED " + existing_state.debug_info)
+
+        if tuple_version_of_state not in self.states_added[column]:
             self.chart[column].append(state)
             self.states_added[column][tuple_version_of_state] = state
 
@@ -160,20 +147,17 @@ class EarleyParser:
                 print(s)
                 state.debug_info = s
 
-                if len(state.backpointers[0]) > 0:
-                    for i in range(0, len(state.backpointers)):
-                        print("    Backpointers List " + str(i))
-                        for bp in state.backpointers[i]:
-                            if bp is not None:
-                                print("        " + bp.debug_info)
-                            else:
-                                print("        None")
+                for bp in backpointer_list(state.backpointers):
+                    if bp is not None:
+                        print("        " + bp.debug_info)
+                    else:
+                        print("        None")
 
     # This function starts the first column with all possible expansions of ROOT
     def add_ROOT_expansions(self):
         for i in range(0, len(self.grammar_rules)):
             if self.grammar_rules[i].lhs == "ROOT":
-                self.enqueue(Entry(i, 0, 0, 0), 0, "DUMMY START STATE")
+                self.enqueue(Entry(i, 0, 0, self.grammar_rules[i].weight), 0, "DUMMY START STATE")
 
 
     def parse(self, sentence):
@@ -188,6 +172,9 @@ class EarleyParser:
             i_row = 0  # this index into chart[i] keeps track of which item remains to predict or scan
             while i_row < len(self.chart[i_col]):  # chart[i] can have additional items added during this loop
                 state = self.chart[i_col][i_row]
+                if state.is_null: # replaced by a cheaper duplicate, which is processed in its place
+                    i_row += 1
+                    continue
                 len_rhs = len(self.grammar_rules[state.rule_index].rhs)
                 period_index = state.period_index
 
@@ -210,36 +197,17 @@ class EarleyParser:
                 i_row += 1
 
 
-    # This recursive helper function prints the subtree
+    # This recursive helper function returns the subtree of an entry as a string
     def print_subtree(self, cur_entry):
-        trees = []
         gr_rule = self.grammar_rules[cur_entry.rule_index]
-        if len(cur_entry.backpointers[0]) == 0: # We are at a terminal
-            trees.append("( " + gr_rule.lhs + " " + gr_rule.rhs[0] + ")")
-        else: # not a non-terminal, so we need to go back through backpointers
-            for bpl in cur_entry.backpointers:
-                trees_bpl = []  # this will contain list of strings generated by just *bpl*'s backpointers
-                trees_bpl.append("(" + gr_rule.lhs + " ")
-                for i in range(0, len(gr_rule.rhs)):
-                    cur_backpointer = bpl[i]
-                    if cur_backpointer is None:
-                        for j in range(0,len(trees_bpl)):
-                            trees_bpl[j] += gr_rule.rhs[i] + " "
-                    else:
-                        subtrees = self.print_subtree(cur_backpointer)
-                        if len(subtrees) == 1:
-                            for j in range(0,len(trees_bpl)):
-                                trees_bpl[j] = trees_bpl[j] + subtrees[0]
-                        else: # this is if there are multiple subtrees
-                            new_trees_bpl = []
-                            for j in range(0,len(trees_bpl)):
-                                for k in range(0, len(subtrees)):
-                                    new_trees_bpl.append(trees_bpl[j] + subtrees[k])
-                            trees_bpl = new_trees_bpl
-                for j in range(0,len(trees_bpl)):
-                    trees_bpl[j] = trees_bpl[j] + ")"
-                trees = trees + trees_bpl
-        return trees
+        tree = "(" + gr_rule.lhs + " "
+        backpointers = backpointer_list(cur_entry.backpointers)
+        for i in range(0, len(gr_rule.rhs)):
+            if backpointers[i] is None:
+                tree += gr_rule.rhs[i] + " "
+            else:
+                tree += self.print_subtree(backpointers[i])
+        return tree + ")"
 
     # This function does the actual printing
     def print(self):
@@ -247,13 +215,10 @@ class EarleyParser:
         count_ROOT = 0
         for entry in self.chart[len(self.chart)-1]:
             if self.grammar_rules[entry.rule_index].lhs == "ROOT" and \
-                    entry.start_index == 0 and \
+                    entry.start_index == 0 and not entry.is_null and \
                     entry.period_index == len(self.grammar_rules[entry.rule_index].rhs):
                 count_ROOT += 1
-                trees = self.print_subtree(entry)
-                weights = [sum([bp.weight for bp in bp_list]) for bp_list in entry.backpointers]
-                for s,w in zip(trees,weights):
-                    print(w,s)
+                print(entry.weight, self.print_subtree(entry))
 #        print("\ncount_ROOT = " + str(count_ROOT))
 
 
@@ -0,0 +1,303 @@
+'''
+Authors: Aaron Mueller, Andrew Blair-Stanek
+Date: 24 October 2018
+Course: Natural Language Processing
+Instructor: Jason Eisner
+Assignment: HW4 -- Parsing
+'''
+# Benchmark and regression harness for the parsers.
+#
+# Runs every engine on every corpus (or the ones asked for), each run in a fresh process so that the
+# peak memory of one run does not hide another's, and reports per run: grammar load time, per-sentence
+# latency (parse + print), chart items, throughput and peak memory (resident set size).
+# Runs whose corpus has reference parses (arith.par, wallstreet.par) are checked against them: weights must
+# match to within WEIGHT_TOLERANCE, and trees exactly (up to spacing) or up to ties. When several trees have
+# the best weight, each engine prints the first one it finds, and the engines find them in different orders
+# (astar.py pops items in order of its estimates, not column by column). parse.py also adds weights up in a
+# different order than the reference parses were made with (a rule's weight when it completes, since its
+# chart entries are trie states shared by several rules), so of two trees of the same weight, float rounding
+# can make either one a hair cheaper (e.g. on hw1grammar.sen and the third wallstreet sentence, parse.py
+# prints a different tree than it did before the trie, whose weight differs in the last digit). So a different
+# tree still passes if it has the same words and its own weight, added up from the grammar's rules, matches
+# the reference weight; it is reported as a tie.
+# With --save-baseline, the throughput of every run is stored; later runs fail if their throughput drops
+# more than --tolerance below it. The exit status is 1 if any check failed or any run regressed.
+#
+#     python bench.py                                        all engines on all corpora
+#     python bench.py --engines parse cky --corpora wallstreet --save-baseline
+#     python bench.py --engines parse --max-sentences 3 --json results.json
+
+import sys
+import io
+import json
+import math
+import time
+import argparse
+import resource
+import contextlib
+import multiprocessing
+from grammar import read_grammar_triples
+
+# The corpora: name -> (grammar file, sentences file, reference parses file or None)
+CORPORA = {
+    "arith": ("arith.gr", "arith.sen", "arith.par"),
+    "wallstreet": ("wallstreet.gr", "wallstreet.sen", "wallstreet.par"),
+    "permissive": ("permissive2.gr", "permissive.sen", None),
+    "papa": ("papa.gr", "papa.sen", None),
+    "papa2": ("papa.gr", "papa2.sen", None),
+    "hw1grammar": ("hw1grammar.gr", "hw1grammar.sen", None),
+    "subtle_bug": ("subtle_bug.gr", "subtle_bug.sen", None),
+}
+
+# The engines: name -> (module, parser class). Every parser class has read_grammar_rules(), parse() and print().
+ENGINES = {
+    "parse": ("parse", "EarleyParser"),
+    "cky": ("cky", "CKYParser"),
+    "astar": ("astar", "AStarParser"),
+    "parse2": ("parse2", "EarleyParser"),
+    "parse2_improved": ("parse2_improved", "EarleyParser"),
+}
+
+# How far a weight may be from the reference weight (relative) and still match it; the engines add weights up
+# in slightly different orders, so the last digits can differ
+WEIGHT_TOLERANCE = 1e-9
+
+DEFAULT_BASELINE = "bench_baseline.json"
+
+# This function returns the number of items in a parser's chart after parse(), or None if it does not keep one
+def chart_items(parser):
+    if getattr(parser, "chart", None) is not None and hasattr(parser.chart, "num_items"):
+        return parser.chart.num_items()
+    if getattr(parser, "finished", None) is not None: # the A* parser keeps its chart in a dictionary
+        return len(parser.finished)
+    return None
+
+# This function does one run (an engine on a corpus) and returns its measurements. It runs in its own process.
+def run_benchmark(job):
+    engine, corpus, max_sentences = job
+    module_name, class_name = ENGINES[engine]
+    grammar_filename, sentences_filename, reference_filename = CORPORA[corpus]
+    with open(sentences_filename) as sen_file:
+        sentences = [sentence for sentence in sen_file if len(sentence.strip()) > 0]
+    if max_sentences is not None:
+        sentences = sentences[:max_sentences]
+
+    start = time.perf_counter()
+    parser = getattr(__import__(module_name), class_name)()
+    parser.read_grammar_rules(grammar_filename)
+    load_seconds = time.perf_counter() - start
+
+    latencies = []
+    items = []
+    outputs = []
+    for sentence in sentences:
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            parser.parse(sentence)
+            parser.print()
+        latencies.append(time.perf_counter() - start)
+        items.append(chart_items(parser))
+        outputs.append(output.getvalue())
+
+    return {"engine": engine, "corpus": corpus, "load_seconds": load_seconds, "latencies": latencies,
+            "chart_items": items, "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "outputs": outputs}
+
+# This function splits the output of a parser (or a reference .par file, which may be pretty-printed over
+# several lines) into one (tree, weight) pair per sentence, with (None, None) for a sentence without a parse.
+# A tree is returned as its tuple of tokens, so that the spacing and line breaks in it do not matter.
+def read_parses(text):
+    tokens = text.replace("(", " ( ").replace(")", " ) ").split()
+    parses = []
+    i = 0
+    while i < len(tokens):
+        if tokens[i] != "(": # NONE, TIMEOUT or OVER BUDGET
+            if tokens[i] == "OVER" and i+1 < len(tokens) and tokens[i+1] == "BUDGET":
+                i += 1
+            parses.append((None, None))
+            i += 1
+            continue
+        start = i
+        depth = 0
+        while True:
+            if tokens[i] == "(":
+                depth += 1
+            elif tokens[i] == ")":
+                depth -= 1
+            i += 1
+            if depth == 0:
+                break
+        parses.append((tuple(tokens[start:i]), float(tokens[i])))
+        i += 1
+    return parses
+
+# This function returns the weights of a grammar's rules, as a dictionary (i.e. hash table) from
+# (lhs, tuple of rhs symbols) to the lowest weight of a rule with that l.h.s. and r.h.s.
+def rule_weights(grammar_filename):
+    with open(grammar_filename) as gr_file:
+        triples = read_grammar_triples(gr_file.read())
+    weights = {}
+    for prob, lhs, rhs in triples:
+        weight = -math.log(prob, 2)
+        if weight < weights.get((lhs, tuple(rhs)), float('inf')):
+            weights[(lhs, tuple(rhs))] = weight
+    return weights
+
+# This function adds up the weight of a tree (a tuple of tokens, see read_parses) from the weights of its
+# rules, and returns it, or None if the tree uses a rule that is not in the grammar
+def tree_weight(tree, weights):
+    total = 0.0
+    open_nodes = [] # [label, list of children's labels and words] of the nodes open at this point
+    i = 0
+    while i < len(tree):
+        if tree[i] == "(":
+            open_nodes.append([tree[i+1], []])
+            i += 2
+            continue
+        if tree[i] == ")":
+            label, children = open_nodes.pop()
+            if (label, tuple(children)) not in weights:
+                return None
+            total += weights[(label, tuple(children))]
+            if len(open_nodes) > 0:
+                open_nodes[-1][1].append(label)
+        else:
+            open_nodes[-1][1].append(tree[i])
+        i += 1
+    return total
+
+# Returns the words of a tree (a tuple of tokens, see read_parses), i.e. the tokens that are not brackets or labels
+def tree_words(tree):
+    return [tree[i] for i in range(0, len(tree)) if tree[i] not in ("(", ")") and tree[i-1] != "("]
+
+# Returns whether a weight matches a reference weight to within WEIGHT_TOLERANCE
+def same_weight(weight, expected_weight):
+    return abs(weight - expected_weight) <= WEIGHT_TOLERANCE * max(1.0, abs(expected_weight))
+
+# This function checks the outputs of a run against its corpus' reference parses (only the sentences the
+# reference covers). It returns a list of problems, empty if everything matches, and a list of the sentences
+# whose tree differs from the reference only as a tie (see above).
+def check_run(result):
+    grammar_filename, sentences_filename, reference_filename = CORPORA[result["corpus"]]
+    if reference_filename is None:
+        return [], []
+    with open(reference_filename) as par_file:
+        expected = read_parses(par_file.read())
+    weights = None # the grammar's rule weights, read the first time a tree differs
+    problems = []
+    ties = []
+    for i in range(0, min(len(expected), len(result["outputs"]))):
+        got = read_parses(result["outputs"][i])
+        if len(got) != 1:
+            problems.append("sentence " + str(i+1) + ": expected one parse, got " + repr(result["outputs"][i]))
+            continue
+        tree, weight = got[0]
+        expected_tree, expected_weight = expected[i]
+        if tree is None or expected_tree is None:
+            if tree != expected_tree:
+                problems.append("sentence " + str(i+1) + ": tree differs from " + reference_filename)
+            continue
+        if not same_weight(weight, expected_weight):
+            problems.append("sentence " + str(i+1) + ": weight " + str(weight) + " instead of " + str(expected_weight))
+            continue
+        if tree != expected_tree:
+            if weights is None:
+                weights = rule_weights(grammar_filename)
+            own_weight = tree_weight(tree, weights)
+            if own_weight is not None and same_weight(own_weight, expected_weight) and \
+                    tree_words(tree) == tree_words(expected_tree):
+                ties.append("sentence " + str(i+1) + ": a different tree of the same weight as in " + reference_filename)
+            else:
+                problems.append("sentence " + str(i+1) + ": tree differs from " + reference_filename)
+    return problems, ties
+
+# Returns the throughput of a run, in sentences per second of parsing (grammar loading excluded)
+def throughput(result):
+    total = sum(result["latencies"])
+    if total == 0:
+        return float('inf')
+    return len(result["latencies"]) / total
+
+# Prints one line of the results table
+def print_row(columns):
+    widths = [16, 12, 6, 9, 10, 10, 10, 10, 9, 0]
+    print("".join([str(columns[i]).ljust(widths[i]) for i in range(0, len(columns))]).rstrip())
+
+
+# This main function coordinates all the code to run
+def main():
+    arg_parser = argparse.ArgumentParser(
+        usage="%(prog)s [--engines E ...] [--corpora C ...] [--max-sentences N] [--json FILE] "
+              "[--baseline FILE] [--save-baseline] [--tolerance T]")
+    arg_parser.add_argument("--engines", nargs="+", choices=list(ENGINES.keys()), default=list(ENGINES.keys()))
+    arg_parser.add_argument("--corpora", nargs="+", choices=list(CORPORA.keys()), default=list(CORPORA.keys()))
+    arg_parser.add_argument("--max-sentences", type=int, default=None,
+                            help="only parse the first N sentences of each corpus")
+    arg_parser.add_argument("--json", dest="json_filename", default=None,
+                            help="also write every measurement (including per-sentence latencies) to this file")
+    arg_parser.add_argument("--baseline", dest="baseline_filename", default=DEFAULT_BASELINE,
+                            help="throughput baseline to compare against (default: " + DEFAULT_BASELINE + ")")
+    arg_parser.add_argument("--save-baseline", action="store_true",
+                            help="store the throughput of these runs in the baseline instead of comparing")
+    arg_parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="fail a run whose throughput is more than this fraction below the baseline "
+                                 "(default: 0.25)")
+    args = arg_parser.parse_args()
+
+    baseline = {}
+    try:
+        with open(args.baseline_filename) as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        pass
+
+    jobs = [(engine, corpus, args.max_sentences) for engine in args.engines for corpus in args.corpora]
+    failed = False
+    results = []
+    print_row(["engine", "corpus", "sents", "load s", "mean ms", "max ms", "sents/s", "items", "peak MB",
+               "check"])
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool: # a fresh process per run
+        for result in pool.imap(run_benchmark, jobs):
+            key = result["engine"] + "/" + result["corpus"]
+            latencies = result["latencies"]
+            items = [x for x in result["chart_items"] if x is not None]
+            problems, ties = check_run(result)
+            status = "ok" if CORPORA[result["corpus"]][2] is not None else "-"
+            if len(ties) > 0:
+                status = "ok (" + str(len(ties)) + " tie" + ("s" if len(ties) > 1 else "") + ")"
+            if len(problems) > 0:
+                status = "MISMATCH"
+            if not args.save_baseline and key in baseline and throughput(result) < baseline[key] * (1 - args.tolerance):
+                problems.append("throughput " + "%.3f" % throughput(result) + " sentences/s is more than " +
+                                str(int(args.tolerance * 100)) + "% below the baseline " + "%.3f" % baseline[key])
+                status = "SLOWER" if status != "MISMATCH" else status + ",SLOWER"
+            print_row([result["engine"], result["corpus"], len(latencies), "%.3f" % result["load_seconds"],
+                       "%.1f" % (1000 * sum(latencies) / max(1, len(latencies))),
+                       "%.1f" % (1000 * max(latencies + [0.0])), "%.2f" % throughput(result),
+                       sum(items) if len(items) > 0 else "-", "%.1f" % (result["peak_rss_kb"] / 1024.0), status])
+            for problem in problems:
+                print("    " + key + ": " + problem)
+            for tie in ties:
+                print("    " + key + ": " + tie + " (tie)")
+            failed = failed or len(problems) > 0
+            result["throughput"] = throughput(result)
+            result["problems"] = problems
+            result["ties"] = ties
+            results.append(result)
+            sys.stdout.flush()
+
+    if args.json_filename is not None:
+        with open(args.json_filename, "w") as json_file:
+            json.dump(results, json_file, indent=1)
+    if args.save_baseline:
+        for result in results:
+            baseline[result["engine"] + "/" + result["corpus"]] = result["throughput"]
+        with open(args.baseline_filename, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=1, sort_keys=True)
+        print("baseline saved to " + args.baseline_filename)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main() # starts execution
@@ -0,0 +1,138 @@
+'''
+Authors: Aaron Mueller, Andrew Blair-Stanek
+Date: 24 October 2018
+Course: Natural Language Processing
+Instructor: Jason Eisner
+Assignment: HW4 -- Parsing
+'''
+# Compact Earley chart shared by the parsers (parse.py, parse2.py, parse2_improved.py)
+
+import array
+
+# The backpointer value meaning "no entry"
+NO_ITEM = -1
+
+# The vert_chain value meaning "no unary chain"
+NO_CHAIN = -1
+
+# Item ids encode a (column, row) pair as column * COLUMN_STRIDE + row, so they stay valid as the chart grows
+COLUMN_STRIDE = 1 << 32
+
+# This class represents a single column of the chart. Instead of one Python object per entry,
+# the column keeps one typed array per field, and an entry is just a row number into all of them.
+class ChartColumn:
+    def __init__(self):
+        self.rule_index = array.array("i")
+        self.start_index = array.array("i")
+        self.period_index = array.array("i")
+        self.weight = array.array("d")
+        '''
+        # Below is the backpointer to the entry holding the prior state of the same rule (hence, horizontal)
+        # Example 1: if the entry is  S -> NP VP .  then this will point to the S -> NP . VP entry
+        # Example 2: if the entry is  S -> NP . VP  then this will be NO_ITEM
+        # Example 3: if the entry is  S -> . NP VP  then this will be NO_ITEM
+        # Example 4: if the entry is  A -> B and C . then this will point to the A -> B and . C entry
+        '''
+        self.horiz_backpointer = array.array("q")
+        '''
+        # Below is the backpointer to the entry for the rule just to the LEFT of the period (hence, vertical)
+        # Example 1: if the entry is  S -> NP VP .  then this will point to the entry for the VP
+        # Example 2: if the entry is  S -> NP . VP  then this will point to the entry for the NP
+        # Example 3: if the entry is  S -> . NP VP  then this will be NO_ITEM
+        # Example 4: if the entry is  A -> B and . C . then this will be NO_ITEM (since "and" is a terminal)
+        '''
+        self.vert_backpointer = array.array("q")
+        # Index into Grammar.unary_chains of the unary rules that turn the entry pointed to by vert_backpointer
+        # into the symbol just to the left of the period, or NO_CHAIN (only parse.py uses unary chains)
+        self.vert_chain = array.array("i")
+
+        # Setting this to 1 means to ignore the entry in the future.
+        # This approach is suggested as OK on the bottom of page R-4 and top of R-5
+        self.is_null = bytearray()
+
+    def __len__(self):
+        return len(self.rule_index)
+
+    # Adds an entry to the end of the column and returns its row number
+    def append(self, rule_index, start_index, period_index, weight, horiz_backpointer, vert_backpointer,
+               vert_chain = NO_CHAIN):
+        self.rule_index.append(rule_index)
+        self.start_index.append(start_index)
+        self.period_index.append(period_index)
+        self.weight.append(weight)
+        self.horiz_backpointer.append(horiz_backpointer)
+        self.vert_backpointer.append(vert_backpointer)
+        self.vert_chain.append(vert_chain)
+        self.is_null.append(0)
+        return len(self.rule_index) - 1
+
+    # Drops every entry except the given rows (in increasing order), which are renumbered 0, 1, 2, ...
+    # Only safe while no backpointer points into this column yet.
+    def keep_rows(self, rows):
+        for name in ("rule_index", "start_index", "period_index", "weight", "horiz_backpointer", "vert_backpointer",
+                     "vert_chain"):
+            old = getattr(self, name)
+            setattr(self, name, array.array(old.typecode, [old[row] for row in rows]))
+        self.is_null = bytearray([self.is_null[row] for row in rows])
+
+
+# This class represents a beam for approximate search: the parser keeps only the best entries of a column.
+# An entry survives if its weight is within threshold of the best weight in the column, and if it is among
+# the max_items lowest-weight entries of the column. A limit that is None is not enforced.
+class Beam:
+    def __init__(self, threshold = None, max_items = None):
+        self.threshold = threshold
+        self.max_items = max_items
+
+    # Returns the indices of the weights that survive the beam, in increasing order
+    def select(self, weights):
+        indices = sorted(range(0, len(weights)), key=lambda index: weights[index])
+        if self.threshold is not None and len(indices) > 0:
+            cutoff = weights[indices[0]] + self.threshold
+            indices = [index for index in indices if weights[index] <= cutoff]
+        if self.max_items is not None:
+            indices = indices[:self.max_items]
+        indices.sort()
+        return indices
+
+    # Returns the rows of a column that survive the beam, in increasing order. Null entries never survive.
+    def survivors(self, column):
+        rows = [row for row in range(0, len(column)) if not column.is_null[row]]
+        return [rows[index] for index in self.select([column.weight[row] for row in rows])]
+
+
+# This class represents the entire chart: one ChartColumn per position in the sentence seen so far.
+# Backpointers are integer item ids (see COLUMN_STRIDE).
+class Chart:
+    def __init__(self, num_columns = 0):
+        self.num_columns = 0
+        self.columns = []
+        for x in range(0, num_columns):
+            self.add_column()
+
+    # Adds an empty column at the end of the chart and returns it
+    def add_column(self):
+        column = ChartColumn()
+        self.columns.append(column)
+        self.num_columns += 1
+        return column
+
+    # Returns the item id of the entry in the given column and row
+    def item_id(self, column, row):
+        return column * COLUMN_STRIDE + row
+
+    # Returns the (column, row) pair of an item id
+    def locate(self, item_id):
+        return divmod(item_id, COLUMN_STRIDE)
+
+    # Returns all the fields of an entry given its item id, as
+    # (rule_index, start_index, period_index, weight, horiz_backpointer, vert_backpointer, vert_chain)
+    def entry(self, item_id):
+        column, row = divmod(item_id, COLUMN_STRIDE)
+        c = self.columns[column]
+        return c.rule_index[row], c.start_index[row], c.period_index[row], c.weight[row], \
+            c.horiz_backpointer[row], c.vert_backpointer[row], c.vert_chain[row]
+
+    # Returns the total number of entries (including null ones) in the chart
+    def num_items(self):
+        return sum([len(c) for c in self.columns])
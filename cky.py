@@ -0,0 +1,241 @@
+'''
+Authors: Aaron Mueller, Andrew Blair-Stanek
+Date: 24 October 2018
+Course: Natural Language Processing
+Instructor: Jason Eisner
+Assignment: HW4 -- Parsing
+'''
+# Vectorized CKY implementation of the weighted parser (run it with  parse.py --engine cky).
+#
+# The grammar is first binarized: terminals inside longer rules get their own preterminal symbol, and every
+# rule  A -> X1 X2 ... Xn  becomes a chain of binary rules through intermediate symbols, one per r.h.s.
+# prefix:  [X1 X2] -> X1 X2,  [X1 X2 X3] -> [X1 X2] X3,  ...,  A -> [X1 ... Xn-1] Xn.
+# The first link carries the rule's weight, so weights are added up in the same order as in the Earley
+# parser (rule weight first, then the children from left to right) and agree with it to the last digit.
+# The intermediate symbols are shared by all the rules with the same prefix and the same weight.
+# The chart then holds, for every span, the Viterbi weight of every symbol, and is filled one span width at
+# a time with NumPy min-plus operations over all the spans, split points and binary rules of that width.
+# Unary rules are applied to each width until nothing improves. The best tree is read off backpointer
+# arrays and printed exactly like parse.py does.
+
+import numpy
+from grammar import load_grammar
+
+# The kinds of backpointer kept for a symbol over a span
+NO_BACKPOINTER = 0
+LEXICAL = 1 # the symbol rewrites as the single word of the span
+BINARY = 2 # the symbol rewrites as two symbols, over the two halves of the span
+UNARY = 3 # the symbol rewrites as another symbol, over the same span
+
+# The original rule index kept for the binary rules and lexical entries that do not come from a rule
+# of the .GR file (the links to intermediate symbols, and preterminal -> word)
+NOT_A_RULE = -1
+
+# This function sorts rules (given as parallel lists) by l.h.s., so the rules for each l.h.s. are contiguous,
+# and returns them as NumPy arrays along with the start and l.h.s. of every group of rules
+def group_by_lhs(lhs, rhs, weights, rules):
+    order = sorted(range(0, len(lhs)), key=lambda i: lhs[i])
+    lhs = numpy.array([lhs[i] for i in order], dtype=numpy.int64)
+    group_starts = numpy.array([i for i in range(0, len(lhs)) if i == 0 or lhs[i] != lhs[i-1]], dtype=numpy.int64)
+    return (lhs,
+            [numpy.array([column[i] for i in order], dtype=numpy.int64) for column in rhs],
+            numpy.array([weights[i] for i in order], dtype=numpy.float64),
+            numpy.array([rules[i] for i in order], dtype=numpy.int64),
+            group_starts,
+            lhs[group_starts])
+
+
+# This class represents the entire parser
+class CKYParser:
+    def __init__(self):
+        self.grammar = None
+        self.grammar_rules = None
+        self.num_symbols = 0 # nonterminals keep their ids; preterminals and intermediate symbols come after
+        self.root = -1 # symbol id of ROOT
+        self.lexicon = None # word id -> list of (symbol id, weight, original rule index)
+        self.binary = None # (lhs, [left, right], weight, rule, group_starts, group_lhs), see group_by_lhs()
+        self.unary = None # (lhs, [child], weight, rule, group_starts, group_lhs), or None if there are none
+        self.words = None
+        self.word_ids = None
+        self.chart = None # [start, end, symbol] -> lowest weight of the symbol over the span
+        self.backpointer_kind = None # [start, end, symbol] -> one of the kinds above
+        self.backpointer_rule = None # [start, end, symbol] -> index into the binary, unary or lexical rules
+        self.backpointer_split = None # [start, end, symbol] -> where a BINARY symbol splits the span
+
+    # Read grammar rules from an external file and binarize them
+    def read_grammar_rules(self, grammar_filename):
+        self.grammar = load_grammar(grammar_filename)
+        self.grammar_rules = self.grammar.rules
+        num_nonterminals = self.grammar.num_nonterminals
+        self.num_symbols = num_nonterminals
+        self.root = self.grammar.symbol_ids["ROOT"]
+
+        self.lexicon = {}
+        preterminals = {} # terminal id -> its preterminal symbol id
+        prefixes = {} # (weight, r.h.s. symbol ids...) -> its intermediate symbol id
+        binary_lhs, binary_left, binary_right, binary_weights, binary_rules = [], [], [], [], []
+        unary_lhs, unary_child, unary_weights, unary_rules = [], [], [], []
+
+        for i_rule in range(0, self.grammar.num_rules):
+            rule = self.grammar_rules[i_rule]
+            if rule.rhs_len == 1:
+                if rule.rhs_ids[0] < num_nonterminals:
+                    unary_lhs.append(rule.lhs_id)
+                    unary_child.append(rule.rhs_ids[0])
+                    unary_weights.append(rule.weight)
+                    unary_rules.append(i_rule)
+                else:
+                    self.lexicon.setdefault(rule.rhs_ids[0], []).append((rule.lhs_id, rule.weight, i_rule))
+                continue
+
+            children = []
+            for symbol in rule.rhs_ids:
+                if symbol >= num_nonterminals: # a terminal inside a longer rule gets a preterminal
+                    if symbol not in preterminals:
+                        preterminals[symbol] = self.num_symbols
+                        self.lexicon.setdefault(symbol, []).append((self.num_symbols, 0.0, NOT_A_RULE))
+                        self.num_symbols += 1
+                    symbol = preterminals[symbol]
+                children.append(symbol)
+
+            left = children[0]
+            weight = rule.weight # on the first link only
+            for k in range(1, len(children) - 1):
+                prefix = tuple([rule.weight] + children[:k+1])
+                if prefix not in prefixes:
+                    prefixes[prefix] = self.num_symbols
+                    binary_lhs.append(self.num_symbols)
+                    binary_left.append(left)
+                    binary_right.append(children[k])
+                    binary_weights.append(weight)
+                    binary_rules.append(NOT_A_RULE)
+                    self.num_symbols += 1
+                left = prefixes[prefix]
+                weight = 0.0
+            binary_lhs.append(rule.lhs_id)
+            binary_left.append(left)
+            binary_right.append(children[-1])
+            binary_weights.append(weight)
+            binary_rules.append(i_rule)
+
+        self.binary = group_by_lhs(binary_lhs, [binary_left, binary_right], binary_weights, binary_rules)
+        self.unary = None
+        if len(unary_lhs) > 0:
+            self.unary = group_by_lhs(unary_lhs, [unary_child], unary_weights, unary_rules)
+
+    # This function lowers the chart entries of every span (starts[s], starts[s] + width) to the best of
+    # candidates[s, r], the weight each rule r of rules (grouped by l.h.s.) would give its l.h.s. over the span.
+    # It records backpointers of the given kind (with split[s, r] for BINARY) and returns whether anything
+    # improved.
+    def relax(self, starts, width, candidates, rules, kind, split = None):
+        group_starts, group_lhs = rules[4], rules[5]
+        ends = starts + width
+        best = numpy.minimum.reduceat(candidates, group_starts, axis=1) # best rule weight per span and l.h.s.
+        better = best < self.chart[starts[:, None], ends[:, None], group_lhs[None, :]]
+        if not better.any():
+            return False
+
+        # the first rule of each group that reaches the group's best weight
+        group_sizes = numpy.diff(numpy.append(group_starts, candidates.shape[1]))
+        positions = numpy.where(candidates == numpy.repeat(best, group_sizes, axis=1),
+                                numpy.arange(candidates.shape[1]), candidates.shape[1])
+        best_rule = numpy.minimum.reduceat(positions, group_starts, axis=1)
+
+        span, group = numpy.nonzero(better)
+        i, j, symbol, rule = starts[span], ends[span], group_lhs[group], best_rule[span, group]
+        self.chart[i, j, symbol] = best[span, group]
+        self.backpointer_kind[i, j, symbol] = kind
+        self.backpointer_rule[i, j, symbol] = rule
+        if split is not None:
+            self.backpointer_split[i, j, symbol] = split[span, rule]
+        return True
+
+    # This function applies the unary rules to all the spans of one width until none of them improves
+    def close_unary(self, starts, width):
+        if self.unary is None:
+            return
+        child, weights = self.unary[1][0], self.unary[2]
+        improved = True
+        while improved:
+            candidates = weights + self.chart[starts, starts + width][:, child]
+            improved = self.relax(starts, width, candidates, self.unary, UNARY)
+
+    # This function actually parses a particular sentence
+    def parse(self, sentence):
+        self.words = sentence.split()
+        self.word_ids = self.grammar.intern_words(self.words)
+        n = len(self.words)
+
+        self.chart = numpy.full((n+1, n+1, self.num_symbols), numpy.inf)
+        self.backpointer_kind = numpy.zeros((n+1, n+1, self.num_symbols), dtype=numpy.int8)
+        self.backpointer_rule = numpy.zeros((n+1, n+1, self.num_symbols), dtype=numpy.int32)
+        self.backpointer_split = numpy.zeros((n+1, n+1, self.num_symbols), dtype=numpy.int32)
+
+        # spans of width 1: the words
+        for i in range(0, n):
+            entries = self.lexicon.get(self.word_ids[i], [])
+            for index in range(0, len(entries)):
+                symbol, weight, i_rule = entries[index]
+                if weight < self.chart[i, i+1, symbol]:
+                    self.chart[i, i+1, symbol] = weight
+                    self.backpointer_kind[i, i+1, symbol] = LEXICAL
+                    self.backpointer_rule[i, i+1, symbol] = index
+        self.close_unary(numpy.arange(0, n), 1)
+
+        # wider spans, all the spans of a width at once
+        lhs, (left, right), weights = self.binary[0], self.binary[1], self.binary[2]
+        for width in range(2, n+1):
+            starts = numpy.arange(0, n - width + 1)
+            # [span, k] -> split point; the latest split comes first, so that ties go to the longest left
+            # child, like in the Earley parser
+            splits = starts[:, None] + numpy.arange(width - 1, 0, -1)[None, :]
+            left_weights = self.chart[starts[:, None], splits][:, :, left] # [span, k, rule]
+            right_weights = self.chart[splits, (starts + width)[:, None]][:, :, right]
+            candidates = (weights + left_weights) + right_weights
+            best_k = candidates.argmin(axis=1) # [span, rule] -> best split, as an index into splits
+            best = numpy.take_along_axis(candidates, best_k[:, None, :], axis=1)[:, 0, :]
+            self.relax(starts, width, best, self.binary, BINARY, numpy.take_along_axis(splits, best_k, axis=1))
+            self.close_unary(starts, width)
+
+
+    # This recursive helper function returns the children of a symbol over a span, as a list of words and
+    # (rule index, children) subtrees. A rule's symbol gives a single subtree, but an intermediate symbol
+    # gives the children it stands for, and a preterminal gives its word.
+    def children(self, i, j, symbol):
+        kind = self.backpointer_kind[i, j, symbol]
+        rule = self.backpointer_rule[i, j, symbol]
+        if kind == LEXICAL:
+            i_rule = self.lexicon[self.word_ids[i]][rule][2]
+            if i_rule == NOT_A_RULE:
+                return [self.words[i]]
+            return [(i_rule, [self.words[i]])]
+        if kind == UNARY:
+            return [(self.unary[3][rule], self.children(i, j, self.unary[1][0][rule]))]
+
+        k = self.backpointer_split[i, j, symbol]
+        result = self.children(i, k, self.binary[1][0][rule]) + self.children(k, j, self.binary[1][1][rule])
+        if self.binary[3][rule] == NOT_A_RULE:
+            return result
+        return [(self.binary[3][rule], result)]
+
+    # This recursive helper function prints a subtree, in the format of parse.py
+    def print_subtree(self, subtree):
+        i_rule, children = subtree
+        print("(" + self.grammar_rules[i_rule].lhs + " ", end="")
+        for child in children:
+            if isinstance(child, str):
+                print(child, end=" ")
+            else:
+                self.print_subtree(child)
+        print(")", end="")
+
+
+    # This function does the actual printing
+    def print(self):
+        n = len(self.words)
+        if self.chart[0, n, self.root] == numpy.inf:
+            print("NONE")
+            return
+        tree = self.children(0, n, self.root)[0]
+        self.print_subtree(tree)
+        print("\n" + str(self.chart[0, n, self.root]))  # print the log-2 weight, as required for HW4
@@ -0,0 +1,527 @@
+'''
+Authors: Aaron Mueller, Andrew Blair-Stanek
+Date: 24 October 2018
+Course: Natural Language Processing
+Instructor: Jason Eisner
+Assignment: HW4 -- Parsing
+'''
+# Compiled grammar shared by the Earley parsers (parse.py, parse2.py, parse2_improved.py)
+
+import sys
+import os
+import math
+import operator
+import mmap
+import array
+import struct
+import hashlib
+import heapq
+import io
+from collections import OrderedDict
+
+# How many words' left-corner sets Grammar.left_corners() keeps around at once
+LEFT_CORNER_CACHE_SIZE = 4096
+
+# The compiled grammar file (wallstreet.gr -> wallstreet.grc) starts with this header:
+# magic, byte order, sha256 of the .gr file, #symbols, #nonterminals, #bytes of symbol names,
+# and then the length of every table in COMPILED_TABLES, in that order
+COMPILED_MAGIC = b"GRC3"
+COMPILED_EXTENSION = ".grc"
+
+# The tables making up a compiled grammar, as (name, array typecode).
+# Symbols are interned as ints: nonterminals first (0 .. num_nonterminals-1), then terminals.
+# "X_start" tables are offsets into "X" (so the items for i are X[X_start[i]:X_start[i+1]]).
+COMPILED_TABLES = [
+    ("rule_lhs", "i"),          # symbol id of each rule's l.h.s.
+    ("rule_rhs_start", "i"),    # offsets into rule_rhs, one per rule plus one
+    ("rule_rhs", "i"),          # symbol ids of every rule's r.h.s., back to back
+    ("rule_prob", "d"),         # probability of each rule
+    ("rule_weight", "d"),       # -log2 probability of each rule
+    ("lhs_rule_start", "i"),    # offsets into lhs_rules, one per nonterminal plus one
+    ("lhs_rules", "i"),         # rule indices grouped by l.h.s.
+    ("lc_parent_start", "i"),   # offsets into lc_parents, one per symbol plus one
+    ("lc_parents", "i"),        # l.h.s. of every rule whose r.h.s. starts with the symbol
+    ("lc_closure_start", "i"),  # offsets into lc_closure, one per nonterminal plus one
+    ("lc_closure", "i"),        # the nonterminal plus everything it is a (transitive) left corner of
+    ("trie_parent", "i"),       # parent of each trie state (-1 for the root state of a nonterminal)
+    ("trie_symbol", "i"),       # symbol id on the edge into each trie state (its l.h.s. for a root state)
+    ("trie_rule", "i"),         # rule index of the lowest-weight rule that ends at each trie state, or -1
+    ("trie_lhs", "i"),          # symbol id of each trie state's l.h.s.
+    ("trie_depth", "i"),        # number of r.h.s. symbols before each trie state's period
+    ("trie_unary", "i"),        # 1 for the trie states where a unary rule (e.g. NP -> NPR) ends, else 0
+    ("trie_child_start", "i"),  # offsets into trie_children, one per trie state plus one
+    ("trie_children", "i"),     # the children of every trie state
+    ("rule_rhs_length", "i"),   # number of r.h.s. symbols of each rule
+    ("unary_chain_start", "i"), # offsets into unary_chains, one per chain plus one
+    ("unary_chains", "i"),      # rule indices of every unary chain, from the top rule down
+    ("unary_closure_start", "i"), # offsets into unary_closure_lhs and unary_closure_chain, one per nonterminal plus one
+    ("unary_closure_lhs", "i"), # the nonterminals that can rewrite as each nonterminal through unary rules alone
+    ("unary_closure_chain", "i"), # ... and the index of the lowest-weight unary chain that does it
+]
+
+# The tables of rows, each with the table of its offsets
+COMPILED_ROW_STARTS = {
+    "rule_rhs": "rule_rhs_start",
+    "lhs_rules": "lhs_rule_start",
+    "lc_parents": "lc_parent_start",
+    "lc_closure": "lc_closure_start",
+    "trie_children": "trie_child_start",
+    "unary_chains": "unary_chain_start",
+    "unary_closure_lhs": "unary_closure_start",
+    "unary_closure_chain": "unary_closure_start",
+}
+
+# The trie_rule value of a trie state at which no rule ends
+NO_RULE = -1
+
+# This class represents a single grammar rule read in from .GR file
+class GrRule:
+    def __init__(self, prob, lhs, rhs, weight = None):
+        self.prob = prob
+        if weight is None:
+            weight = -math.log(self.prob, 2)
+        self.weight = weight
+        self.lhs = lhs
+        self.rhs = rhs
+        self.rhs_len = len(rhs)
+        self.lhs_id = -1 # interned (int) form of lhs, filled in by Grammar
+        self.rhs_ids = None # interned (int) form of rhs, filled in by Grammar
+        self.rhs_has_nonterminals = False # filled in by Grammar once every l.h.s. is known
+        self.first_rhs_is_nonterminal = False # filled in by Grammar once every l.h.s. is known
+
+    def to_string(self, index_period = -1):
+        s = self.lhs + " -->"
+        for i in range(0, len(self.rhs)):
+            if i == index_period:
+                s += " ."
+            s += " " + self.rhs[i]
+        if index_period == len(self.rhs):
+            s += " . "
+        return s
+
+
+    def print(self, index_period = -1):
+        s = self.to_string(index_period)
+        print(s, end="")
+
+
+# This class is a table of rows that are only built (by build(index)) the first time they are looked up, and
+# then kept. It is a dictionary (i.e. hash table) underneath, so a row that is already built costs one lookup,
+# but it has the length of the table and iterates over its rows in order, like a list.
+class LazyRows(dict):
+    def __init__(self, num_rows, build):
+        dict.__init__(self)
+        self.num_rows = num_rows
+        self.build = build
+
+    def __missing__(self, index):
+        if index < 0 or index >= self.num_rows:
+            raise IndexError("row " + str(index) + " of a table of " + str(self.num_rows))
+        row = self.build(index)
+        self[index] = row
+        return row
+
+    def __len__(self):
+        return self.num_rows
+
+    def __iter__(self):
+        for index in range(0, self.num_rows):
+            yield self[index]
+
+
+# This class represents a whole grammar, compiled into tables that the parsers can index directly
+# instead of scanning the full list of rules every time they need the rules for one symbol.
+# It is always built from the integer tables described by COMPILED_TABLES, which either come from
+# compile_tables() (when reading a .gr file) or straight out of a memory-mapped .grc file. Loading does
+# no work per rule or per state beyond copying the flat tables the parsers' hot loops index into lists (one
+# C-level copy each, since a list is faster to index than the mapped file); the tables with a row per rule,
+# symbol or state (the GrRule objects, the trie's children, ...) build each row the first time it is looked
+# up (see LazyRows), so a sentence only pays for the part of the grammar it touches.
+class Grammar:
+    def __init__(self, symbols, num_nonterminals, tables):
+        self.symbols = symbols # symbol id -> symbol string
+        self.symbol_ids = dict(zip(symbols, range(0, len(symbols)))) # symbol string -> symbol id
+        self.num_nonterminals = num_nonterminals
+        self.tables = tables
+        self.num_rules = len(tables["rule_lhs"])
+
+        self.rules = LazyRows(self.num_rules, self.build_rule) # list of GrRule, in the order of the .GR file
+
+        # The parsers' hot loops work on symbol ids rather than strings, so these are indexed by rule index
+        self.rule_lhs_ids = tables["rule_lhs"].tolist()
+        self.rule_rhs_ids = LazyRows(self.num_rules, lambda i_rule: self.table_row("rule_rhs", i_rule))
+        self.rhs_lengths = tables["rule_rhs_length"].tolist() # precomputed len(rule.rhs) for every rule index
+
+        # rule indices by l.h.s. symbol id (empty for a terminal)
+        self.rules_by_lhs_id = LazyRows(len(symbols), lambda x: self.table_row("lhs_rules", x)
+                                        if x < num_nonterminals else [])
+
+        # The left-corner relation, over symbol ids: left_corner_parents maps any symbol X to the l.h.s. of
+        # every rule whose r.h.s. starts with X, and left_corner_closure maps each nonterminal to itself
+        # plus everything that can have it as a (transitive) left corner
+        self.left_corner_parents = LazyRows(len(symbols), lambda x: self.table_row("lc_parents", x))
+        self.left_corner_closure = LazyRows(num_nonterminals,
+                                            lambda a: dict.fromkeys(self.table_row("lc_closure", a), True))
+        self.left_corner_cache = OrderedDict() # word id -> left corners, least recently used first
+
+        # The rules of each l.h.s. merged into a trie of dotted states: a state stands for an l.h.s. and the
+        # r.h.s. prefix on the path to it, shared by every rule that starts with that prefix. State a (for
+        # a < num_nonterminals) is the root for l.h.s. a, i.e. "a -> . ..."
+        self.num_states = len(tables["trie_parent"])
+        self.state_rule = tables["trie_rule"].tolist() # state -> rule ending there (NO_RULE if none)
+        self.state_lhs = tables["trie_lhs"].tolist() # state -> symbol id of its l.h.s.
+        self.state_depth = tables["trie_depth"].tolist() # state -> number of r.h.s. symbols before its period
+        self.state_parent = tables["trie_parent"].tolist()
+        self.state_symbol = tables["trie_symbol"].tolist()
+        child_starts = tables["trie_child_start"].tolist()
+        self.state_num_children = list(map(operator.sub, child_starts[1:], child_starts[:-1]))
+        # The parsers look these two up for every chart entry, so they are plain lists (faster to index than
+        # a LazyRows) whose rows are None until build_state() fills them in, which parse.py does for every
+        # state as it goes into the chart
+        self.state_children = [None] * self.num_states # state -> dictionary from symbol id to child state
+        self.state_predictions = [None] * self.num_states # state -> symbol ids of its nonterminal children
+
+        # A unary rule rewrites a nonterminal as a single nonterminal (e.g. NP -> NPR). For every nonterminal b,
+        # unary_closure[b] lists (a, chain) for each other nonterminal a that can rewrite as b through unary
+        # rules alone, where unary_chains[chain] holds the rule indices of the lowest-weight way to do so,
+        # from a's rule down to the rule whose r.h.s. is b. state_unary marks the states where a unary rule ends.
+        self.state_unary = tables["trie_unary"].tolist()
+        self.unary_chains = LazyRows(len(tables["unary_chain_start"]) - 1,
+                                     lambda chain: self.table_row("unary_chains", chain))
+        self.unary_closure = LazyRows(num_nonterminals, lambda b: list(zip(self.table_row("unary_closure_lhs", b),
+                                                                           self.table_row("unary_closure_chain", b))))
+
+    # Returns row i of a table of rows, i.e. the items of the table between its offsets i and i+1, as a list
+    def table_row(self, name, i):
+        starts = self.tables[COMPILED_ROW_STARTS[name]]
+        return self.tables[name][starts[i]:starts[i+1]].tolist()
+
+    # Builds the GrRule of a rule index (see self.rules)
+    def build_rule(self, i_rule):
+        rhs_ids = self.rule_rhs_ids[i_rule]
+        rule = GrRule(self.tables["rule_prob"][i_rule], self.symbols[self.rule_lhs_ids[i_rule]],
+                      [self.symbols[x] for x in rhs_ids], self.tables["rule_weight"][i_rule])
+        rule.lhs_id = self.rule_lhs_ids[i_rule]
+        rule.rhs_ids = rhs_ids
+        rule.rhs_has_nonterminals = min(rhs_ids) < self.num_nonterminals
+        rule.first_rhs_is_nonterminal = rhs_ids[0] < self.num_nonterminals
+        return rule
+
+    # Fills in the rows of a trie state in self.state_children and self.state_predictions, if they are
+    # not there yet
+    def build_state(self, state):
+        if self.state_children[state] is not None:
+            return
+        children = {}
+        for child in self.table_row("trie_children", state):
+            children[self.state_symbol[child]] = child
+        self.state_children[state] = children
+        self.state_predictions[state] = [x for x in children if x < self.num_nonterminals]
+
+    # Returns a trie state as a dotted rule, e.g. "NP -> Det N ." (followed by "..." if longer rules
+    # continue from it)
+    def state_to_string(self, state):
+        rhs = []
+        x = state
+        while self.state_parent[x] >= 0:
+            rhs.insert(0, self.symbols[self.state_symbol[x]])
+            x = self.state_parent[x]
+        s = self.symbols[self.state_lhs[state]] + " -> " + " ".join(rhs) + " ."
+        if self.state_num_children[state] > 0:
+            s += " ..."
+        return s
+
+    # This helper function determines whether a string is a non-terminal in the grammar
+    # (a symbol is a nonterminal exactly when it appears on the l.h.s. of some rule)
+    def is_nonterminal(self, symbol):
+        return 0 <= self.symbol_ids.get(symbol, -1) < self.num_nonterminals
+
+    # This helper function determines whether a string is a terminal in the grammar
+    # (every symbol that only appears on r.h.s.'s)
+    def is_terminal(self, symbol):
+        return self.symbol_ids.get(symbol, -1) >= self.num_nonterminals
+
+    # Returns the list of rule indices whose l.h.s. is the given symbol (empty if there are none)
+    def rules_for(self, lhs):
+        if not self.is_nonterminal(lhs):
+            return []
+        return self.rules_by_lhs_id[self.symbol_ids[lhs]]
+
+    # Maps the words of a sentence to symbol ids, once per sentence. A word that does not appear
+    # anywhere in the grammar gets -1, which never matches any symbol.
+    def intern_words(self, words):
+        return [self.symbol_ids.get(word, -1) for word in words]
+
+    # Returns a dictionary (i.e. hash table) of the ids of all possible left corners of a word (given
+    # by its id): the word itself plus every symbol that can start with it. Results are kept in a
+    # bounded cache, so a word that shows up again (in the same or a later sentence) costs one lookup.
+    def left_corners(self, word_id):
+        d = self.left_corner_cache.get(word_id)
+        if d is not None:
+            self.left_corner_cache.move_to_end(word_id)
+            return d
+
+        d = {word_id: True} # the word is in its own left corner
+        if word_id >= 0:
+            for parent in self.left_corner_parents[word_id]:
+                d.update(self.left_corner_closure[parent])
+
+        self.left_corner_cache[word_id] = d
+        if len(self.left_corner_cache) > LEFT_CORNER_CACHE_SIZE:
+            self.left_corner_cache.popitem(last=False) # evict the least recently used word
+        return d
+
+
+# This helper function turns a list of lists of ints into a pair of (offsets, items) arrays
+def to_offset_arrays(lists):
+    starts = array.array("i", [0])
+    items = array.array("i")
+    for lst in lists:
+        items.extend(lst)
+        starts.append(len(items))
+    return starts, items
+
+
+# Compile a list of (prob, lhs, rhs) triples into interned symbols and the tables in COMPILED_TABLES.
+# Returns (symbols, num_nonterminals, tables).
+def compile_tables(triples):
+    # intern the nonterminals first, so that "is a nonterminal" is just "id < num_nonterminals"
+    symbol_ids = {}
+    symbols = []
+    for prob, lhs, rhs in triples:
+        if lhs not in symbol_ids:
+            symbol_ids[lhs] = len(symbols)
+            symbols.append(lhs)
+    num_nonterminals = len(symbols)
+    for prob, lhs, rhs in triples:
+        for rhs_item in rhs:
+            if rhs_item not in symbol_ids:
+                symbol_ids[rhs_item] = len(symbols)
+                symbols.append(rhs_item)
+
+    tables = {}
+    tables["rule_lhs"] = array.array("i", [symbol_ids[lhs] for prob, lhs, rhs in triples])
+    tables["rule_rhs_start"], tables["rule_rhs"] = \
+        to_offset_arrays([[symbol_ids[x] for x in rhs] for prob, lhs, rhs in triples])
+    tables["rule_prob"] = array.array("d", [prob for prob, lhs, rhs in triples])
+    tables["rule_weight"] = array.array("d", [-math.log(prob, 2) for prob, lhs, rhs in triples])
+
+    rules_by_lhs = [[] for a in range(0, num_nonterminals)]
+    for i_rule in range(0, len(triples)):
+        rules_by_lhs[tables["rule_lhs"][i_rule]].append(i_rule)
+    tables["lhs_rule_start"], tables["lhs_rules"] = to_offset_arrays(rules_by_lhs)
+
+    # the left-corner relation and its transitive closure are computed once here, at compile time
+    lc_parents = [[] for x in range(0, len(symbols))]
+    for prob, lhs, rhs in triples:
+        first, parent = symbol_ids[rhs[0]], symbol_ids[lhs]
+        if parent not in lc_parents[first]:
+            lc_parents[first].append(parent)
+    tables["lc_parent_start"], tables["lc_parents"] = to_offset_arrays(lc_parents)
+
+    lc_closure = []
+    for a in range(0, num_nonterminals):
+        closure = [a]
+        seen = {a: True}
+        agenda = [a]
+        while len(agenda) > 0:
+            for parent in lc_parents[agenda.pop()]:
+                if parent not in seen:
+                    seen[parent] = True
+                    closure.append(parent)
+                    agenda.append(parent)
+        lc_closure.append(closure)
+    tables["lc_closure_start"], tables["lc_closure"] = to_offset_arrays(lc_closure)
+
+    # the trie of dotted states: one root per nonterminal, then one state per distinct (l.h.s., r.h.s. prefix)
+    trie_parent = [-1] * num_nonterminals
+    trie_symbol = list(range(0, num_nonterminals))
+    trie_rule = [NO_RULE] * num_nonterminals
+    children = [{} for a in range(0, num_nonterminals)]
+    for i_rule in range(0, len(triples)):
+        prob, lhs, rhs = triples[i_rule]
+        state = symbol_ids[lhs]
+        for rhs_item in rhs:
+            x = symbol_ids[rhs_item]
+            if x not in children[state]:
+                children[state][x] = len(trie_parent)
+                trie_parent.append(state)
+                trie_symbol.append(x)
+                trie_rule.append(NO_RULE)
+                children.append({})
+            state = children[state][x]
+        # Several rules with the same l.h.s. and r.h.s. end at the same state, which keeps only the first
+        # lowest-weight one: the others are never in a parse (nor among parse.py's k best trees, nor counted
+        # by rule_profile.py). A grammar without such duplicates is not affected.
+        if trie_rule[state] == NO_RULE or \
+                tables["rule_weight"][i_rule] < tables["rule_weight"][trie_rule[state]]:
+            trie_rule[state] = i_rule
+    tables["trie_parent"] = array.array("i", trie_parent)
+    tables["trie_symbol"] = array.array("i", trie_symbol)
+    tables["trie_rule"] = array.array("i", trie_rule)
+
+    # what the parsers need to know about each state, worked out once here rather than at every load
+    trie_lhs = list(trie_symbol[0:num_nonterminals])
+    trie_depth = [0] * num_nonterminals
+    trie_children = [[] for x in range(0, len(trie_parent))]
+    for state in range(num_nonterminals, len(trie_parent)): # (a parent always comes before its children)
+        parent = trie_parent[state]
+        trie_lhs.append(trie_lhs[parent])
+        trie_depth.append(trie_depth[parent] + 1)
+        trie_children[parent].append(state)
+    tables["trie_lhs"] = array.array("i", trie_lhs)
+    tables["trie_depth"] = array.array("i", trie_depth)
+    tables["trie_unary"] = array.array("i", [int(trie_rule[state] != NO_RULE and trie_depth[state] == 1 and
+                                                 trie_symbol[state] < num_nonterminals)
+                                             for state in range(0, len(trie_parent))])
+    tables["trie_child_start"], tables["trie_children"] = to_offset_arrays(trie_children)
+    tables["rule_rhs_length"] = array.array("i", [len(rhs) for prob, lhs, rhs in triples])
+
+    # the lowest-weight chains of unary rules (see Grammar.unary_closure)
+    unary_parents = [[] for b in range(0, num_nonterminals)] # b -> the unary rules whose r.h.s. is b
+    for i_rule in range(0, len(triples)):
+        prob, lhs, rhs = triples[i_rule]
+        if len(rhs) == 1 and symbol_ids[rhs[0]] < num_nonterminals:
+            unary_parents[symbol_ids[rhs[0]]].append(i_rule)
+    unary_chains = []
+    unary_closure = [[] for b in range(0, num_nonterminals)]
+    for b in range(0, num_nonterminals):
+        best = {b: (0.0, [])} # nonterminal -> (weight, chain) of the best chain found so far down to b
+        finished = {}
+        agenda = [(0.0, b)]
+        while len(agenda) > 0: # Dijkstra's algorithm, going up the unary rules from b
+            weight, x = heapq.heappop(agenda)
+            if x in finished:
+                continue
+            finished[x] = True
+            if x != b:
+                unary_closure[b].append((x, len(unary_chains)))
+                unary_chains.append(best[x][1])
+            for i_rule in unary_parents[x]:
+                a = tables["rule_lhs"][i_rule]
+                new_weight = tables["rule_weight"][i_rule] + weight
+                if a not in finished and (a not in best or new_weight < best[a][0]):
+                    best[a] = (new_weight, [i_rule] + best[x][1])
+                    heapq.heappush(agenda, (new_weight, a))
+    tables["unary_chain_start"], tables["unary_chains"] = to_offset_arrays(unary_chains)
+    tables["unary_closure_start"], tables["unary_closure_lhs"] = \
+        to_offset_arrays([[a for a, chain in pairs] for pairs in unary_closure])
+    tables["unary_closure_chain"] = to_offset_arrays([[chain for a, chain in pairs] for pairs in unary_closure])[1]
+
+    return symbols, num_nonterminals, tables
+
+
+# Read the (prob, lhs, rhs) triples out of the text of a .GR file (named by source in error messages).
+# A rule with an empty r.h.s. raises ValueError naming its line: the compiled tables (the trie, the left
+# corners) and the parsers' predictor assume that every rule has at least one r.h.s. symbol.
+def read_grammar_triples(text, source = "the grammar"):
+    triples = []
+    line_number = 0
+    for line in io.StringIO(text):
+        line_number += 1
+        if len(line) > 2:
+            arr = line.split()
+            prob = float(arr.pop(0))
+            lhs = arr.pop(0)
+            if len(arr) == 0:
+                raise ValueError(source + ", line " + str(line_number) + ": the rule for " + lhs +
+                                 " has an empty right-hand side, which is not supported")
+            triples.append((prob, lhs, arr))
+    return triples
+
+
+# Read grammar rules from an external file and compile them into a Grammar.
+def read_grammar(grammar_filename):
+    with open(grammar_filename) as infile:
+        text = infile.read()
+    return Grammar(*compile_tables(read_grammar_triples(text, grammar_filename)))
+
+
+# Returns the name of the compiled grammar file that goes next to a .GR file
+def compiled_grammar_filename(grammar_filename):
+    return os.path.splitext(grammar_filename)[0] + COMPILED_EXTENSION
+
+
+# This helper function computes the header of a compiled grammar file
+def compiled_header(digest, symbols_bytes, num_symbols, num_nonterminals, table_lengths):
+    return COMPILED_MAGIC + sys.byteorder[0].encode() + digest + \
+        struct.pack("=%dq" % (3 + len(COMPILED_TABLES)),
+                    num_symbols, num_nonterminals, len(symbols_bytes), *table_lengths)
+
+
+# This helper function pads a section of a compiled grammar file to a multiple of 8 bytes
+def padding(num_bytes):
+    return b"\0" * (-num_bytes % 8)
+
+
+# Write the compiled form of a grammar (symbols and tables) to a .GRC file.
+# The file is written under a temporary name and then renamed, so a reader never sees half of it.
+def write_compiled_grammar(compiled_filename, digest, symbols, num_nonterminals, tables):
+    symbols_bytes = "\n".join(symbols).encode("utf-8")
+    table_lengths = [len(tables[name]) for name, typecode in COMPILED_TABLES]
+    header = compiled_header(digest, symbols_bytes, len(symbols), num_nonterminals, table_lengths)
+
+    temp_filename = compiled_filename + ".tmp" + str(os.getpid())
+    with open(temp_filename, "wb") as outfile:
+        outfile.write(header + padding(len(header)))
+        outfile.write(symbols_bytes + padding(len(symbols_bytes)))
+        for name, typecode in COMPILED_TABLES:
+            data = tables[name].tobytes()
+            outfile.write(data + padding(len(data)))
+    os.replace(temp_filename, compiled_filename)
+
+
+# Memory-map a .GRC file and return (symbols, num_nonterminals, tables), where every table is a
+# memoryview straight into the mapped file. Returns None if the file is missing, was written for a
+# different .GR file (by sha256 digest) or on a machine with the other byte order.
+def map_compiled_grammar(compiled_filename, digest):
+    try:
+        with open(compiled_filename, "rb") as infile:
+            mapped = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError): # ValueError is what mmap raises for an empty file
+        return None
+
+    fixed_size = len(COMPILED_MAGIC) + 1 + len(digest)
+    counts_format = "=%dq" % (3 + len(COMPILED_TABLES))
+    if len(mapped) < fixed_size + struct.calcsize(counts_format) or \
+            mapped[0:fixed_size] != COMPILED_MAGIC + sys.byteorder[0].encode() + digest:
+        return None
+    counts = struct.unpack_from(counts_format, mapped, fixed_size)
+    num_symbols, num_nonterminals, num_symbol_bytes = counts[0:3]
+
+    view = memoryview(mapped)
+    offset = fixed_size + struct.calcsize(counts_format)
+    offset += len(padding(offset))
+    symbols = str(view[offset:offset+num_symbol_bytes], "utf-8").split("\n")
+    offset += num_symbol_bytes + len(padding(num_symbol_bytes))
+
+    tables = {}
+    for (name, typecode), length in zip(COMPILED_TABLES, counts[3:]):
+        num_bytes = length * array.array(typecode).itemsize
+        if offset + num_bytes > len(mapped):
+            return None
+        tables[name] = view[offset:offset+num_bytes].cast(typecode)
+        offset += num_bytes + len(padding(num_bytes))
+
+    if len(symbols) != num_symbols:
+        return None
+    return symbols, num_nonterminals, tables
+
+
+# Load a grammar, going through its compiled .GRC file whenever that is up to date.
+# The .GR file is still read (to hash it), but not parsed; if the .GRC file is missing or stale,
+# the .GR file is compiled as usual and a fresh .GRC file is written next to it for next time.
+def load_grammar(grammar_filename):
+    with open(grammar_filename, "rb") as infile:
+        data = infile.read()
+    digest = hashlib.sha256(data).digest()
+    compiled_filename = compiled_grammar_filename(grammar_filename)
+
+    compiled = map_compiled_grammar(compiled_filename, digest)
+    if compiled is None:
+        compiled = compile_tables(read_grammar_triples(data.decode("utf-8"), grammar_filename))
+        try:
+            write_compiled_grammar(compiled_filename, digest, *compiled)
+        except OSError:
+            pass # e.g. a read-only directory; the grammar simply gets compiled again next time
+    return Grammar(*compiled)
@@ -0,0 +1,207 @@
+'''
+Authors: Aaron Mueller, Andrew Blair-Stanek
+Date: 24 October 2018
+Course: Natural Language Processing
+Instructor: Jason Eisner
+Assignment: HW4 -- Parsing
+'''
+# Lazy k-best tree extraction from the chart of parse.py (run it with  parse.py -k N).
+#
+# With EarleyParser.k_best set, the parser keeps every derivation of every chart entry as an edge
+# (horizontal backpointer, vertical backpointer, unary chain), not just the best one. The entries and their
+# edges form a hypergraph, and this module enumerates its derivations in order of increasing weight with
+# Algorithm 3 of Huang & Chiang (2005), "Better k-best parsing": the j-th best derivation of an entry is only
+# worked out when something asks for it, and a derivation is only put on an entry's candidate heap once the
+# one just before it in the same direction has been used. Nothing is built for entries that never come up.
+# The derivations an entry needs from its backpointers are worked out with an explicit stack rather than by
+# recursion, since the chart of a long sentence can be hundreds of entries deep.
+
+import heapq
+from chart import NO_ITEM, NO_CHAIN
+
+# The edge index of a derivation that has no edges (a predicted entry, with the period at the start)
+NO_EDGE = -1
+
+# What known_kth() returns for a derivation that has not been worked out yet
+UNKNOWN = object()
+
+# This class holds the derivations of the chart of a parse found so far, and finds more of them on demand.
+# A derivation of an entry is a tuple (weight, edge index, j_horiz, j_vert): the weight of the entry's r.h.s.
+# so far, which of the entry's edges it uses, and which derivations (by rank) of the edge's horizontal and
+# vertical backpointers.
+class KBestDerivations:
+    def __init__(self, parser):
+        self.parser = parser
+        self.grammar = parser.grammar
+        self.grammar_rules = parser.grammar_rules
+        self.chart = parser.chart
+        self.edges = parser.edges
+        self.derivations = {} # dictionary (i.e. hash table) from item id to its derivations found so far, best first
+        self.candidates = {} # item id -> heap of the derivations that could come next
+        self.seen = {} # item id -> dictionary of the (edge index, j_horiz, j_vert) ever put on its heap
+        self.num_expanded = {} # item id -> how many of its derivations have had their successors put on its heap
+        self.initialized = {} # item ids whose edges' best derivations have all been put on their heap
+        self.busy = {} # item ids whose derivations are being worked out (only matters for cycles of unary rules)
+
+    # Returns the edges of an entry, as a list of (horiz_backpointer, vert_backpointer, vert_chain)
+    def entry_edges(self, item_id):
+        column, row = self.chart.locate(item_id)
+        c = self.chart.columns[column]
+        return self.edges.get((c.rule_index[row], c.start_index[row], c.period_index[row], column), [])
+
+    # Returns the weight of a complete entry as a constituent, given the weight of its r.h.s.: its rule's
+    # weight is added first, then that of the unary chain wrapped around it (if any), like in parse.py
+    def constituent_weight(self, item_id, weight, chain):
+        weight = self.grammar_rules[self.grammar.state_rule[self.chart.entry(item_id)[0]]].weight + weight
+        if chain == NO_CHAIN:
+            return weight
+        return self.parser.chain_weight(chain, weight)
+
+    # Returns the k-th best (counting from 0) derivation of an entry if it is known by now: the derivation, None
+    # if the entry has fewer than k+1, or UNKNOWN if more of its derivations must be worked out first. An entry
+    # being worked out (through a cycle of unary rules) only has the derivations it has found so far.
+    def known_kth(self, item_id, k):
+        if item_id in self.busy:
+            derivations = self.derivations[item_id]
+            return derivations[k] if k < len(derivations) else None
+        if item_id not in self.initialized:
+            return UNKNOWN
+        derivations = self.derivations[item_id]
+        if k < len(derivations):
+            return derivations[k]
+        if len(self.candidates[item_id]) == 0 and self.num_expanded[item_id] >= len(derivations):
+            return None
+        return UNKNOWN
+
+    # Puts a derivation on an entry's candidate heap, unless it was already there once or does not exist.
+    # Returns None, or (item id, k) if the k-th derivation of a backpointer must be worked out first; nothing
+    # has changed then, and it should be called again once it has been.
+    def push_candidate(self, item_id, edge_index, j_horiz, j_vert):
+        key = (edge_index, j_horiz, j_vert)
+        if key in self.seen[item_id]:
+            return None
+        horiz_backpointer, vert_backpointer, vert_chain = self.entry_edges(item_id)[edge_index]
+        weight = 0.0
+        if horiz_backpointer != NO_ITEM:
+            derivation = self.known_kth(horiz_backpointer, j_horiz)
+            if derivation is UNKNOWN:
+                return (horiz_backpointer, j_horiz)
+            weight = None if derivation is None else weight + derivation[0]
+        if weight is not None and vert_backpointer != NO_ITEM:
+            derivation = self.known_kth(vert_backpointer, j_vert)
+            if derivation is UNKNOWN:
+                return (vert_backpointer, j_vert)
+            if derivation is None:
+                weight = None
+            else:
+                weight += self.constituent_weight(vert_backpointer, derivation[0], vert_chain)
+        self.seen[item_id][key] = True
+        if weight is not None:
+            heapq.heappush(self.candidates[item_id], (weight, edge_index, j_horiz, j_vert))
+        return None
+
+    # This function works out the derivations of an entry up to the k-th best, or all of them if it has fewer.
+    # Returns None once it is done, or (item id, k) if the k-th derivation of a backpointer must be worked out
+    # first; it carries on from where it stopped when called again.
+    def work_out(self, item_id, k):
+        if item_id not in self.initialized:
+            edges = self.entry_edges(item_id)
+            for edge_index in range(0, len(edges)):
+                needed = self.push_candidate(item_id, edge_index, 0, 0)
+                if needed is not None:
+                    return needed
+            self.initialized[item_id] = True
+
+        derivations = self.derivations[item_id]
+        candidates = self.candidates[item_id]
+        while len(derivations) <= k:
+            # the successors of the last derivation were left for now; they are needed at last
+            if self.num_expanded[item_id] < len(derivations):
+                weight, edge_index, j_horiz, j_vert = derivations[self.num_expanded[item_id]]
+                if edge_index != NO_EDGE:
+                    horiz_backpointer, vert_backpointer, vert_chain = self.entry_edges(item_id)[edge_index]
+                    if horiz_backpointer != NO_ITEM:
+                        needed = self.push_candidate(item_id, edge_index, j_horiz + 1, j_vert)
+                        if needed is not None:
+                            return needed
+                    if vert_backpointer != NO_ITEM:
+                        needed = self.push_candidate(item_id, edge_index, j_horiz, j_vert + 1)
+                        if needed is not None:
+                            return needed
+                self.num_expanded[item_id] += 1
+                continue
+            if len(candidates) == 0:
+                break
+            derivations.append(heapq.heappop(candidates))
+        return None
+
+    # Returns the k-th best (counting from 0) derivation of an entry, or None if it has fewer than k+1.
+    # Derivations that use an entry inside its own subtree (through a cycle of unary rules) are skipped.
+    def kth(self, item_id, k):
+        derivation = self.known_kth(item_id, k)
+        if derivation is not UNKNOWN:
+            return derivation
+        stack = [(item_id, k)] # the entries being worked out, each waiting for the one above it
+        while len(stack) > 0:
+            top_id, top_k = stack[-1]
+            if top_id not in self.derivations:
+                self.derivations[top_id] = []
+                self.candidates[top_id] = []
+                self.seen[top_id] = {}
+                self.num_expanded[top_id] = 0
+                if len(self.entry_edges(top_id)) == 0:
+                    self.derivations[top_id].append((0.0, NO_EDGE, 0, 0))
+            self.busy[top_id] = True
+            needed = self.work_out(top_id, top_k)
+            if needed is None:
+                stack.pop()
+                del self.busy[top_id]
+            else:
+                stack.append(needed)
+        return self.known_kth(item_id, k)
+
+    # This generator yields the complete parses of the sentence, best first, as pairs (weight, (item id, j))
+    # where j is the rank of the derivation of the item id, a complete ROOT entry over the whole sentence
+    def parses(self):
+        root_rules = set(self.grammar.rules_for("ROOT"))
+        i_col = self.chart.num_columns - 1
+        column = self.chart.columns[i_col]
+        heap = []
+        for i_row in range(0, len(column)):
+            rule_index = self.grammar.state_rule[column.rule_index[i_row]]
+            if rule_index in root_rules and column.start_index[i_row] == 0 and not column.is_null[i_row]:
+                item_id = self.chart.item_id(i_col, i_row)
+                derivation = self.kth(item_id, 0)
+                if derivation is not None:
+                    heap.append((self.constituent_weight(item_id, derivation[0], NO_CHAIN), item_id, 0))
+        heapq.heapify(heap)
+        while len(heap) > 0:
+            weight, item_id, j = heapq.heappop(heap)
+            yield weight, (item_id, j)
+            derivation = self.kth(item_id, j + 1)
+            if derivation is not None:
+                heapq.heappush(heap, (self.constituent_weight(item_id, derivation[0], NO_CHAIN), item_id, j + 1))
+
+    # This function returns the rule of the j-th derivation of a complete entry, given as a node (item id, j),
+    # and the derivation's children: one per r.h.s. symbol, either (node, unary chain) or None for a terminal
+    # (see serialize.py)
+    def expand(self, node):
+        item_id, j = node
+        gr_rule = self.grammar_rules[self.grammar.state_rule[self.chart.entry(item_id)[0]]]
+
+        # follow the derivation's edges, from the last child to the first
+        children = []
+        derivation = self.kth(item_id, j)
+        while derivation[1] != NO_EDGE:
+            weight_so_far, edge_index, j_horiz, j_vert = derivation
+            horiz_backpointer, vert_backpointer, vert_chain = self.entry_edges(item_id)[edge_index]
+            if vert_backpointer == NO_ITEM:
+                children.append(None)
+            else:
+                children.append(((vert_backpointer, j_vert), vert_chain))
+            if horiz_backpointer == NO_ITEM:
+                break
+            item_id = horiz_backpointer
+            derivation = self.kth(item_id, j_horiz)
+        children.reverse()
+        return gr_rule, children
@@ -6,276 +6,909 @@ Instructor: Jason Eisner
 Assignment: HW4 -- Parsing
 '''
 # Basic implementation of (non-probabilistic) Earley parser
+#
+# The parser works on the Grammar's trie of dotted states (see grammar.py) rather than on single rules:
+# all the rules with the same l.h.s. and the same r.h.s. prefix share one chart entry up to the point
+# where they differ, and the rule's own weight is only added when it is complete.
 
 import sys
+import io
+import json
+import time
+import heapq
+import argparse
+import itertools
+import contextlib
+import multiprocessing
 import numpy
-import math
-
-# This class represents a single grammar rule read in from .GR file
-class GrRule:
-    def __init__(self, prob, lhs, rhs):
-        self.prob = prob
-        self.weight = -math.log(self.prob, 2)
-        self.lhs = lhs
-        self.rhs = rhs
-
-    def to_string(self, index_period = -1):
-        s = self.lhs + " -->"
-        for i in range(0, len(self.rhs)):
-            if i == index_period:
-                s += " ."
-            s += " " + self.rhs[i]
-        if index_period == len(self.rhs):
-            s += " . "
-        return s
-
-
-    def print(self, index_period = -1):
-        s = self.to_string(index_period)
-        print(s, end="")
-
-
-# This class represents a single entry (i.e., the rule, the start index, and the period index)
-class Entry:
-    def __init__(self, rule_index, start_index, period_index, weight):
-        self.rule_index = rule_index
-        self.start_index = start_index
-        self.period_index = period_index
-        self.weight = weight
-        '''
-        # Below is the backpointer to the entry holding the prior state of the same rule (hence, horizontal)
-        # Example 1: if the entry is  S -> NP VP .  then this will point to the S -> NP . VP entry
-        # Example 2: if the entry is  S -> NP . VP  then this will be None
-        # Example 3: if the entry is  S -> . NP VP  then this will be None
-        # Example 4: if the entry is  A -> B and C . then this will point to the A -> B and . C entry
-        '''
-        self.horiz_backpointer = None
-        '''
-        # Below is the backpointer to the entry for the rule just to the LEFT of the period (hence, vertical)
-        # Example 1: if the entry is  S -> NP VP .  then this will point to the entry for the VP
-        # Example 2: if the entry is  S -> NP . VP  then this will point to the entry for the NP
-        # Example 3: if the entry is  S -> . NP VP  then this will be None
-        # Example 4: if the entry is  A -> B and . C . then this will be None (since "and" is a terminal)
-        '''
-        self.vert_backpointer = None
-
-        # Setting this to true means to ignore the entry in the future.
-        # This approach is suggested as OK on the bottom of page R-4 and top of R-5
-        self.is_null = False
-
-        # This is used solely for debugging purposes when debugging is turned on
-        self.debug_info = None
+from grammar import load_grammar, NO_RULE
+from chart import Chart, Beam, NO_ITEM, NO_CHAIN
+from cky import CKYParser
+from kbest import KBestDerivations
+import serialize
+
+# The possible outcomes of EarleyParser.parse(), kept in EarleyParser.status
+PARSE_OK = "OK" # the chart was filled completely (whether or not the sentence has a parse)
+PARSE_TIMEOUT = "TIMEOUT" # the sentence took longer than its budget's max_seconds
+PARSE_OVER_BUDGET = "OVER BUDGET" # the chart grew past its budget's max_items or max_column_items
+
+# How many rows of a column the parser processes between two checks of its budget
+BUDGET_CHECK_INTERVAL = 256
+
+# How many sentences' output parse.py collects before writing it to stdout in one go
+OUTPUT_BATCH_SIZE = 64
+
+# This class represents the limits on how much work parse() may do on one sentence.
+# A limit that is None is not enforced.
+class ParseBudget:
+    def __init__(self, max_seconds = None, max_items = None, max_column_items = None):
+        self.max_seconds = max_seconds # wall-clock time for the whole sentence
+        self.max_items = max_items # entries in the whole chart
+        self.max_column_items = max_column_items # entries in any one column of the chart
+
+
+# This class holds the counters of the work parse() did on one sentence (see parse.py --stats).
+# The parser only keeps one when its collect_stats is set; otherwise every counting site costs a single
+# "is None" test.
+class ParseStats:
+    def __init__(self):
+        self.predictor_calls = 0
+        self.predicted_rules = 0 # rules with the predicted l.h.s., over all the calls: what a predictor would
+                                 # look at without the trie, where one state stands for all of them
+        self.predicted_items = 0 # predictions that put a new state on the agenda
+        self.scan_candidates = 0 # entries checked for the next word
+        self.scanner_hits = 0 # entries that could scan it
+        self.attach_calls = 0 # complete entries attached
+        self.attach_customers = 0 # entries waiting for a completed l.h.s. that attach_as() looked at
+        self.attach_matches = 0 # customers advanced (enqueued) by attach_as()
+        self.unary_attaches = 0 # constituents attached as another l.h.s. through a unary chain
+        self.enqueue_calls = 0
+        self.duplicate_rejections = 0 # derivations dropped for a state already in the chart or the agenda
+        self.viterbi_replacements = 0 # pending derivations replaced by a cheaper one of the same state
+        self.dead_entries = 0 # chart entries replaced by a cheaper duplicate (see num_dead_entries)
+        self.stale_pops = 0 # agenda entries popped after their state had got a cheaper derivation
+        self.beam_pruned = 0 # chart entries nulled out by the beam (see prune_column())
+        self.items_per_column = [] # chart entries in each column, once the column is filled
+
+    # Returns the counters as a dictionary, ready for json.dumps()
+    def to_dict(self):
+        return dict(vars(self))
 
 
 # This class represents the entire parser
 class EarleyParser:
     def __init__(self):
+        self.grammar = None
         self.grammar_rules = None
         self.num_rules = -1
-        self.chart = None
-        self.states_added = None
+        self.chart = None # a Chart (see chart.py); an entry is a row in one of its columns, and its
+                          # rule_index field holds a trie state rather than a rule
+        self.waiting = None # per column: dictionary from the symbol just after the period to rows waiting on it
+        self.states_added = None # dictionary (i.e. hash table) from state to its row, once it is in the chart
+        self.agendas = None # per column: heap of (weight, order, state) waiting to be put in the chart
+        self.pending = None # dictionary from state to (weight, horiz, vert, order, calling_function) of its
+                            # lowest-weight derivation so far, until the state is put in the chart
+        self.unary_attached = None # dictionary from (l.h.s., start, end) to the lowest weight at which attach()
+                                   # attached a constituent as that l.h.s. through a unary chain
+        self.num_enqueued = 0 # derivations put on the agendas so far; breaks ties first-come first-served
+        self.num_dead_entries = 0 # chart entries replaced by a cheaper duplicate (is_null), over all sentences
+        self.budget = None # a ParseBudget, or None to parse every sentence to completion
+        self.status = PARSE_OK # how the last call to parse() ended
+        self.words = None # the words fed so far
+        self.word_ids = None
+        self.deadline = None # time.monotonic() past which the sentence is abandoned, or None
+        self.beam = None # a Beam (see chart.py) for approximate search, or None for exhaustive search
+        self.prefix_weights = None # with a beam: per column, the lowest weight of an entry in it that starts at 0
+        self.k_best = None # how many trees print() prints per sentence, best first, or None for just the best one
+        self.output_format = "bracket" # how print() writes trees: one of serialize.FORMATS
+        self.edges = None # with k_best set: dictionary from state to all its derivations (horiz, vert, vert_chain),
+                          # not just the best one (see kbest.py)
+        self.collect_stats = False # whether to count the work done on each sentence in self.stats
+        self.stats = None # a ParseStats for the sentence being (or last) parsed, if collect_stats is set
 
     # Read grammar rules from an external file.
-    # The rules are read into a list of GrRule.
+    # The rules are compiled into a Grammar (see grammar.py), which indexes them by l.h.s.
     def read_grammar_rules(self, grammar_filename):
-        self.grammar_rules = []
-        with open(grammar_filename) as infile:
-            for line in infile:
-                if len(line) > 2:
-                    arr = line.split()
-                    prob = float(arr.pop(0))
-                    lhs = arr.pop(0)
-                    self.grammar_rules.append(GrRule(prob, lhs, arr))
-        self.num_rules = len(self.grammar_rules)
+        self.grammar = load_grammar(grammar_filename)
+        self.grammar_rules = self.grammar.rules
+        self.num_rules = self.grammar.num_rules
 
     # This is the first operator in Earley (out of three), see J&M p.444
     # It expands a possible operator into multiple
-    def predictor(self, state, i_col, next_cat):
-        for i_rule in range(0, len(self.grammar_rules)):
-            if self.grammar_rules[i_rule].lhs == next_cat:
-                new_entry = Entry(i_rule, i_col, 0, self.grammar_rules[i_rule].weight) # <-- Possible prior bug
-                self.enqueue(new_entry, i_col, "PREDICTOR") # attempt to add new state, if not already added
+    # All the rules whose l.h.s. is next_cat start out as the single trie state next_cat, of weight 0
+    def predictor(self, i_row, i_col, next_cat):
+        if self.stats is not None:
+            self.stats.predictor_calls += 1
+            self.stats.predicted_rules += len(self.grammar.rules_by_lhs_id[next_cat])
+        # attempt to add new state, if not already added
+        self.enqueue(next_cat, i_col, 0, 0.0, NO_ITEM, NO_ITEM, i_col, "PREDICTOR")
 
 
     # This is the second operator in Earley (out of three), see J&M p.444
     # It puts a new completed entry in the NEXT column of the chart
-    def scanner(self, state, i_col):
-        new_entry = Entry(state.rule_index,
-                          state.start_index,
-                          state.period_index+1,
-                          state.weight) # scanning a terminal doesn't change probabilities; use state's weight
+    def scanner(self, i_row, i_col, word):
+        column = self.chart.columns[i_col]
+        period_index = column.period_index[i_row]
+        if self.stats is not None:
+            self.stats.scanner_hits += 1
 
         # We keep a horizontal backpointer only if it is necessary for interpreting the rule
         # For example, if new_entry will be  A -> B and . C  then backpoint to  A -> B . and C
         # For example, if new_entry will be  NP -> a majority . of N  then backpoint to  NP -> a . majority of N
         # But, for example, do not backpoint if this is  NP --> Papa .
-        if state.period_index > 0:
-            new_entry.horiz_backpointer = state
+        horiz_backpointer = NO_ITEM
+        if period_index > 0:
+            horiz_backpointer = self.chart.item_id(i_col, i_row)
 
-        self.enqueue(new_entry, i_col +1, "SCANNER")
+        self.enqueue(self.grammar.state_children[column.rule_index[i_row]][word],
+                     column.start_index[i_row],
+                     period_index + 1,
+                     column.weight[i_row], # scanning a terminal doesn't change probabilities; use state's weight
+                     horiz_backpointer,
+                     NO_ITEM,
+                     i_col + 1,
+                     "SCANNER")
 
 
     # This is the third operator in Earley, called "Completer" by J&M p.444
     # It goes back to PRIOR chart entries to find "customers" for a completed state
-    def attach(self, state, i_col):
-        match_seeking = self.grammar_rules[state.rule_index].lhs
-        icol2 = state.start_index
-        for irow2 in range(0, len(self.chart[icol2])):
-            entry2 = self.chart[icol2][irow2]
-            if not entry2.is_null and entry2.period_index < len(self.grammar_rules[entry2.rule_index].rhs):
-                # then this may be seeking a completion
-                possible_match = self.grammar_rules[entry2.rule_index].rhs[entry2.period_index]
-                if possible_match == match_seeking:  # if this is true, we have a "customer" to "attach"
-                    weight = entry2.weight + state.weight
-                    new_entry = Entry(entry2.rule_index,
-                                      entry2.start_index,
-                                      entry2.period_index + 1,
-                                      weight)
-                    new_entry.vert_backpointer = state
-                    if entry2.period_index > 0:
-                        new_entry.horiz_backpointer = entry2
-
-                    self.enqueue(new_entry, i_col, "ATTACH")
+    # The completed rule's own weight is added to the weight of its r.h.s. here.
+    # Unary rules are never completed one at a time: a completed B is also attached, in the same step, as
+    # every A that can rewrite as B through unary rules alone (see Grammar.unary_closure), using the best chain.
+    def attach(self, i_row, i_col):
+        column = self.chart.columns[i_col]
+        state = column.rule_index[i_row]
+        match_seeking = self.grammar.state_lhs[state]
+        state_weight = column.weight[i_row] + self.grammar_rules[self.grammar.state_rule[state]].weight
+        entry = self.chart.item_id(i_col, i_row)
+        start_index = column.start_index[i_row]
+        if self.stats is not None:
+            self.stats.attach_calls += 1
+
+        self.attach_as(match_seeking, state_weight, entry, NO_CHAIN, start_index, i_col)
+        if self.edges is not None:
+            return # k-best trees need every derivation, so unary rules are attached one at a time instead
+        for lhs, chain in self.grammar.unary_closure[match_seeking]:
+            if lhs in self.waiting[start_index]: # i.e. if anything is waiting for lhs at all
+                weight = self.chain_weight(chain, state_weight)
+                # several constituents over the same span can become lhs; only attach the best ones
+                key = (lhs, start_index, i_col)
+                if key not in self.unary_attached or weight < self.unary_attached[key]:
+                    self.unary_attached[key] = weight
+                    if self.stats is not None:
+                        self.stats.unary_attaches += 1
+                    self.attach_as(lhs, weight, entry, chain, start_index, i_col)
+
+    # This function returns the weight of a constituent of the given weight, wrapped in a chain of unary
+    # rules; like everywhere else, a rule's weight comes first and then its child's
+    def chain_weight(self, chain, weight):
+        unary_rules = self.grammar.unary_chains[chain]
+        for i in range(len(unary_rules) - 1, -1, -1):
+            weight = self.grammar_rules[unary_rules[i]].weight + weight
+        return weight
+
+    # This helper function of attach() advances the customers of a completed match_seeking, spanning
+    # icol2 to i_col: the entry (wrapped in the unary chain, if any) becomes their vertical backpointer
+    def attach_as(self, match_seeking, state_weight, entry, chain, icol2, i_col):
+        # only the entries in the start column that are waiting for match_seeking are "customers"
+        column2 = self.chart.columns[icol2]
+        customers = self.waiting[icol2].get(match_seeking, [])
+        if self.stats is not None:
+            self.stats.attach_customers += len(customers)
+        for irow2 in customers:
+            if not column2.is_null[irow2]:
+                child = self.grammar.state_children[column2.rule_index[irow2]][match_seeking]
+                if self.grammar.state_unary[child] and self.grammar.state_num_children[child] == 0 and \
+                        self.edges is None:
+                    continue # the unary rule  A -> match_seeking .  is already covered by the unary closure
+
+                period_index2 = column2.period_index[irow2]
+                horiz_backpointer = NO_ITEM
+                if period_index2 > 0:
+                    horiz_backpointer = self.chart.item_id(icol2, irow2)
+
+                if self.stats is not None:
+                    self.stats.attach_matches += 1
+                self.enqueue(child,
+                             column2.start_index[irow2],
+                             period_index2 + 1,
+                             column2.weight[irow2] + state_weight,
+                             horiz_backpointer,
+                             entry,
+                             i_col,
+                             "ATTACH",
+                             chain)
 
 
     # This is a crucial helper function in Earley, see J&M p.444
     # It tries to add a state to the chart a column i_col.
     # It only adds that state if it has not already been added in i_col.
-    def enqueue(self, state, column, calling_function):
-        tuple_version_of_state = (state.rule_index,
-                                  state.start_index,
-                                  state.period_index,
+    # The state goes on the column's agenda first; parse() moves states from the agenda into the chart in order
+    # of increasing weight (see finalize()), so a cheaper derivation that arrives in the meantime simply
+    # replaces the pending one, and no entry of the chart ever has to be replaced.
+    def enqueue(self, rule_index, start_index, period_index, weight,
+                horiz_backpointer, vert_backpointer, column, calling_function, vert_chain = NO_CHAIN):
+        tuple_version_of_state = (rule_index,
+                                  start_index,
+                                  period_index,
                                   column) # Column is in the tuple so there is only one hash table "states_added"
-
-        if tuple_version_of_state in self.states_added and calling_function == "ATTACH":
-            existing_state = self.states_added[tuple_version_of_state]
+        stats = self.stats
+        if stats is not None:
+            stats.enqueue_calls += 1
+
+        if self.edges is not None and calling_function in ("SCANNER", "ATTACH"):
+            if tuple_version_of_state not in self.edges:
+                self.edges[tuple_version_of_state] = []
+            self.edges[tuple_version_of_state].append((horiz_backpointer, vert_backpointer, vert_chain))
+
+        if tuple_version_of_state in self.states_added:
+            if calling_function != "ATTACH":
+                if stats is not None:
+                    stats.duplicate_rejections += 1
+                return
+            chart_column = self.chart.columns[column]
+            existing_row = self.states_added[tuple_version_of_state]
 
             # If there is an existing state that has a lower weight than state, then do not enqueue
-            # state; just return instead
-            if existing_state.weight <= state.weight:
+            # state; just return instead. Since states are put in the chart in order of weight, this
+            # always happens (weights are never negative), so num_dead_entries stays 0.
+            if chart_column.weight[existing_row] <= weight:
+                if stats is not None:
+                    stats.duplicate_rejections += 1
                 return
             else: # but if the existing state has a higher weight, remove it so we can enqueue state
-                existing_state.is_null = True # disregard the existing, higher-weight state
+                chart_column.is_null[existing_row] = 1 # disregard the existing, higher-weight state
                 del self.states_added[tuple_version_of_state] # remove the existing, higher-weight state from dict
-
-        if tuple_version_of_state not in self.states_added:
-            self.chart[column].append(state)
-            self.states_added[tuple_version_of_state] = state
-
-            if False: # Turn this to True to turn on debugging information
-                s = str(state.start_index) + " "
-                s += self.grammar_rules[state.rule_index].to_string(state.period_index)
-                s += " (weight = " + str(state.weight) + ")"
-                s += " (Added by " + calling_function + " at Col = " + \
-                        str(column) + " Row = " + str(len(self.chart[column]) - 1) + ")"
-                print(s)
-                state.debug_info = s
-
+                self.num_dead_entries += 1
+                if stats is not None:
+                    stats.dead_entries += 1
+
+        if tuple_version_of_state in self.pending:
+            if calling_function != "ATTACH" or self.pending[tuple_version_of_state][0] <= weight:
+                if stats is not None:
+                    stats.duplicate_rejections += 1
+                return # the pending derivation is at least as good
+            if stats is not None:
+                stats.viterbi_replacements += 1
+        elif stats is not None and calling_function == "PREDICTOR":
+            stats.predicted_items += 1
+
+        self.pending[tuple_version_of_state] = (weight, horiz_backpointer, vert_backpointer, vert_chain,
+                                                self.num_enqueued, calling_function)
+        heapq.heappush(self.agendas[column], (weight, self.num_enqueued, tuple_version_of_state))
+        self.num_enqueued += 1
+
+
+    # This function puts a state popped from an agenda into the chart, with the best derivation it got.
+    # It returns the state's row, or None if the agenda entry is stale (the state got a cheaper derivation).
+    def finalize(self, tuple_version_of_state, order):
+        # an entry is stale if its state was already put in the chart, or got a cheaper derivation since
+        if tuple_version_of_state not in self.pending or self.pending[tuple_version_of_state][4] != order:
+            if self.stats is not None:
+                self.stats.stale_pops += 1
+            return None
+        weight, horiz_backpointer, vert_backpointer, vert_chain, pending_order, calling_function = \
+            self.pending[tuple_version_of_state]
+        del self.pending[tuple_version_of_state]
+
+        rule_index, start_index, period_index, column = tuple_version_of_state
+        self.grammar.build_state(rule_index) # every state in the chart has its trie rows (see Grammar.build_state)
+        row = self.chart.columns[column].append(rule_index, start_index, period_index, weight,
+                                                horiz_backpointer, vert_backpointer, vert_chain)
+        self.states_added[tuple_version_of_state] = row
+        self.add_to_waiting(rule_index, period_index, column, row)
+
+        if False: # Turn this to True to turn on debugging information
+            s = str(start_index) + " "
+            s += self.grammar.state_to_string(rule_index)
+            s += " (weight = " + str(weight) + ")"
+            s += " (Added by " + calling_function + " at Col = " + \
+                    str(column) + " Row = " + str(row) + ")"
+            print(s)
+        return row
+
+
+    # Index an entry by the (ids of the) nonterminals that can come after its period, so attach() can find
+    # its customers
+    def add_to_waiting(self, rule_index, period_index, column, row):
+        for waiting_for in self.grammar.state_predictions[rule_index]:
+            if waiting_for not in self.waiting[column]:
+                self.waiting[column][waiting_for] = []
+            self.waiting[column][waiting_for].append(row)
+
+
+    # This function applies self.beam to column i_col once all of its entries are in the chart. The entries
+    # that do not survive it are nulled out, so no later column scans them or attaches to them (the entries
+    # they already led to within the column are pruned along with the rest, or not, on their own weight).
+    # Entries that start at different positions cover different words, so they are compared by their weight
+    # plus the prefix weight of their start (see self.prefix_weights): otherwise every long constituent would
+    # lose to the short ones. Predicted entries (period_index 0) are kept: they all weigh 0 (a rule's weight
+    # is added when it completes), and nothing can start in a later column without them.
+    def prune_column(self, i_col):
+        column = self.chart.columns[i_col]
+        rows = [i_row for i_row in range(0, len(column))
+                if column.period_index[i_row] > 0 and not column.is_null[i_row]]
+        kept = self.beam.select([self.prefix_weights[column.start_index[i_row]] + column.weight[i_row]
+                                 for i_row in rows])
+        kept_set = set(kept)
+        for index in range(0, len(rows)):
+            if index not in kept_set:
+                column.is_null[rows[index]] = 1
+        if self.stats is not None:
+            self.stats.beam_pruned += len(rows) - len(kept)
+
+        prefix_weight = float("inf") if i_col > 0 else 0.0 # (if nothing starting at 0 is left, nothing can parse)
+        for index in kept:
+            if column.start_index[rows[index]] == 0:
+                prefix_weight = min(prefix_weight, column.weight[rows[index]])
+        self.prefix_weights.append(prefix_weight)
 
     # This function starts the first column with all possible expansions of ROOT
     def add_ROOT_expansions(self):
-        for i in range(0, len(self.grammar_rules)):
-            if self.grammar_rules[i].lhs == "ROOT":
-                self.enqueue(Entry(i, 0, 0, self.grammar_rules[i].weight), 0, "DUMMY START STATE")
-
-
-    # This function actually parses a particular sentence
-    def parse(self, sentence):
-        words = sentence.split()
-
-        self.chart = [[] for x in range(0, len(words)+1)] # create the chart
+        if self.grammar.is_nonterminal("ROOT"):
+            self.enqueue(self.grammar.symbol_ids["ROOT"], 0, 0, 0.0, NO_ITEM, NO_ITEM, 0, "DUMMY START STATE")
+
+
+    # This function checks the chart against self.budget while column i_col is being processed.
+    # It returns PARSE_OK if parsing may go on, or else the status to stop with.
+    def check_budget(self, i_col, deadline):
+        if deadline is not None and time.monotonic() > deadline:
+            return PARSE_TIMEOUT
+        max_column_items = self.budget.max_column_items
+        if max_column_items is not None:
+            for column in range(i_col, self.chart.num_columns):
+                if len(self.chart.columns[column]) + len(self.agendas[column]) > max_column_items:
+                    return PARSE_OVER_BUDGET
+        if self.budget.max_items is not None and \
+                self.chart.num_items() + len(self.pending) > self.budget.max_items:
+            return PARSE_OVER_BUDGET
+        return PARSE_OK
+
+    # This function gives up on the sentence being parsed, recording why in self.status.
+    # The chart is freed right away rather than when the next sentence is parsed.
+    def abandon_parse(self, status):
+        self.status = status
+        self.chart = None
+        self.waiting = None
+        self.states_added = None
+        self.agendas = None
+        self.pending = None
+        self.unary_attached = None
+        self.edges = None
+
+    # The parser can also be fed a sentence one word at a time, keeping its chart between the calls:
+    #     begin(), then feed(word) for each word (is_viable() and best_partial() may be asked after any of
+    #     them), then finish() and print().
+    # Each call to feed() only scans the new word and fills the new column, so its cost does not grow with
+    # the number of words already fed. parse() does exactly this for a whole sentence.
+
+    # This function starts a new sentence: an empty chart whose first column holds the expansions of ROOT
+    def begin(self):
+        self.words = []
+        self.word_ids = []
+        self.status = PARSE_OK
+        self.deadline = None
+        if self.budget is not None and self.budget.max_seconds is not None:
+            self.deadline = time.monotonic() + self.budget.max_seconds
+
+        self.chart = Chart() # create the chart; it gets one more column per word
+        self.waiting = [] # per column "waiting-for-symbol" index
         self.states_added = {} # dictionary (i.e. hash table) of states used
+        self.agendas = []
+        self.pending = {}
+        self.unary_attached = {}
+        self.prefix_weights = []
+        self.edges = None
+        if self.k_best is not None:
+            self.edges = {}
+        self.stats = None
+        if self.collect_stats:
+            self.stats = ParseStats()
+        self.add_column()
         self.add_ROOT_expansions() # add all ROOT rules to the start of the chart
-
-        for i_col in range(0, len(words)+1):  # iterates over columns in Earley chart
-
-            i_row = 0  # this index into chart[i] keeps track of which item remains to predict or scan
-            while i_row < len(self.chart[i_col]):  # chart[i] can have additional items added during this loop
-                state = self.chart[i_col][i_row]
-
-                if not state.is_null: # i.e. if we have not eliminated it because there is another lower-weight entry
-                    len_rhs = len(self.grammar_rules[state.rule_index].rhs)
-                    period_index = state.period_index
-
-                    if period_index > len_rhs:  # this means there is an error
-                        sys.exit("ERROR: period_index > len_rhs")
-
-                    incomplete = period_index < len_rhs # an entry is "complete" if all rules are left of the period
-
-                    if incomplete:
-                        next_cat = self.grammar_rules[state.rule_index].rhs[period_index]
-
-                        if i_col < len(words) and next_cat == words[i_col]:
-                            self.scanner(state, i_col)
-                        else:
-                            self.predictor(state, i_col, next_cat)
-                    else:  # if we are here, we have a completed item and we need to run ATTACH (a/k/a COMPLETE)
-                        self.attach(state, i_col)
-
-                i_row += 1
-
-
-    # This recursive helper function prints the subtree
-    def print_entry(self, entry):
-        gr_rule = self.grammar_rules[entry.rule_index]
-
-        print("(" + gr_rule.lhs + " ", end="")
-
-        # construct a list of all entries making up this rule, by following pointers
-        list_entries = []
+        self.process_column(0)
+
+    # This function adds an empty column to the end of the chart, along with its index and agenda
+    def add_column(self):
+        self.chart.add_column()
+        self.waiting.append({})
+        self.agendas.append([])
+
+    # This function extends the chart by one word: it scans the word from every entry of the last column
+    # that can take it, and then fills the new column. It does nothing once the parse has been abandoned.
+    def feed(self, word):
+        if self.status != PARSE_OK:
+            return
+        word_id = self.grammar.intern_words([word])[0] # the parser compares symbol ids, never strings
+        i_col = len(self.words)
+        self.words.append(word)
+        self.word_ids.append(word_id)
+
+        self.add_column()
+        column = self.chart.columns[i_col]
+        if self.stats is not None:
+            self.stats.scan_candidates += len(column) - column.is_null.count(1)
+        for i_row in range(0, len(column)):
+            if not column.is_null[i_row] and word_id in self.grammar.state_children[column.rule_index[i_row]]:
+                self.scanner(i_row, i_col, word_id)
+        self.process_column(i_col+1)
+
+    # This function ends the sentence, freeing everything but the chart (and edges), which print() still needs
+    def finish(self):
+        self.waiting = None
+        self.states_added = None
+        self.agendas = None
+        self.pending = None
+        self.unary_attached = None
+        self.prefix_weights = None
+
+    # This function returns whether the words fed so far are still the beginning of some sentence of the
+    # grammar (as far as the beam allows), i.e. whether the last column of the chart has any (live) entry at all
+    def is_viable(self):
+        column = self.chart.columns[self.chart.num_columns - 1]
+        return self.status == PARSE_OK and len(column) > column.is_null.count(1)
+
+    # This function returns the best analysis of the words fed so far, as a pair (weight, bracketed tree), or
+    # None if there is none. The analysis is the lowest-weight entry of the last column, complete or not, on
+    # a path from ROOT: wrapped in the customers that are waiting for it, and for them in turn, up to ROOT
+    # (see root_paths()). Its tree closes every constituent still open after the last word, and its weight
+    # counts the constituents finished so far and the words of the open ones, but not the rules of the open
+    # ones, which are not known yet. A complete ROOT spanning all the words is an analysis of its own.
+    def best_partial(self):
+        if self.status != PARSE_OK:
+            return None
+        i_col = self.chart.num_columns - 1
+        column = self.chart.columns[i_col]
+        paths = self.root_paths()
+        min_entry = NO_ITEM
+        min_weight = float('inf')
+        for i_row in range(0, len(column)):
+            if column.period_index[i_row] == 0 or column.is_null[i_row]:
+                continue
+            state = column.rule_index[i_row]
+            path = paths[column.start_index[i_row]].get(self.grammar.state_lhs[state])
+            if path is None: # nothing that can reach ROOT is waiting for this entry
+                continue
+            weight = path[0] + column.weight[i_row]
+            if self.grammar.state_rule[state] != NO_RULE: # a complete entry: its rule is known
+                weight += self.grammar_rules[self.grammar.state_rule[state]].weight
+            if weight < min_weight:
+                min_weight = weight
+                min_entry = self.chart.item_id(i_col, i_row)
+        if min_entry == NO_ITEM:
+            return None
+
+        # the customers on the path from ROOT down to min_entry, outermost first
+        customers = []
+        customer = min_entry
+        while True:
+            state, start_index = self.chart.entry(customer)[0:2]
+            customer = paths[start_index][self.grammar.state_lhs[state]][1]
+            if customer == NO_ITEM:
+                break
+            customers.insert(0, customer)
+
+        events = []
+        weight = 0.0
+        for customer in customers:
+            customer_events, customer_weight = self.partial_events(customer)
+            events.extend(customer_events)
+            weight += customer_weight
+        state = self.chart.entry(min_entry)[0]
+        if self.grammar.state_rule[state] != NO_RULE:
+            entry_events, entry_weight = self.tree_events(min_entry)
+        else:
+            entry_events, entry_weight = self.partial_events(min_entry)
+            entry_events.append((serialize.CLOSE, None))
+        events.extend(entry_events)
+        events.extend([(serialize.CLOSE, None)] * len(customers))
+        return weight + entry_weight, serialize.to_bracket(events)
+
+    # This function works out, for the chart so far, how each constituent that could start somewhere would be
+    # connected to ROOT. It returns, per column s, a dictionary (i.e. hash table) from symbol id A to
+    # (weight, customer): customer is the entry (waiting for A in column s) that an A starting at s would
+    # be attached to on the lowest-weight path up to ROOT, and weight adds up the weights of the customers
+    # on that path. ROOT itself, starting at 0, needs no customer (NO_ITEM). A customer that starts at s too
+    # (a predicted entry) costs nothing, so each column is worked out with Dijkstra's algorithm from the
+    # customers that start before it.
+    def root_paths(self):
+        paths = []
+        for i_col in range(0, self.chart.num_columns):
+            column = self.chart.columns[i_col]
+            best = {}
+            agenda = []
+            if i_col == 0 and self.grammar.is_nonterminal("ROOT"):
+                best[self.grammar.symbol_ids["ROOT"]] = (0.0, NO_ITEM)
+                agenda.append((0.0, self.grammar.symbol_ids["ROOT"]))
+            predicted = {} # l.h.s. of a predicted entry -> [(symbol it waits for, row)]
+            for i_row in range(0, len(column)):
+                if column.is_null[i_row]:
+                    continue
+                state = column.rule_index[i_row]
+                lhs = self.grammar.state_lhs[state]
+                if column.period_index[i_row] == 0:
+                    for waiting_for in self.grammar.state_predictions[state]:
+                        predicted.setdefault(lhs, []).append((waiting_for, i_row))
+                    continue
+                path = paths[column.start_index[i_row]].get(lhs)
+                if path is None:
+                    continue
+                weight = path[0] + column.weight[i_row]
+                for waiting_for in self.grammar.state_predictions[state]:
+                    if waiting_for not in best or weight < best[waiting_for][0]:
+                        best[waiting_for] = (weight, self.chart.item_id(i_col, i_row))
+                        heapq.heappush(agenda, (weight, waiting_for))
+            heapq.heapify(agenda)
+            while len(agenda) > 0:
+                weight, symbol = heapq.heappop(agenda)
+                if weight > best[symbol][0]:
+                    continue
+                for waiting_for, i_row in predicted.get(symbol, []):
+                    if waiting_for not in best or weight < best[waiting_for][0]:
+                        best[waiting_for] = (weight, self.chart.item_id(i_col, i_row))
+                        heapq.heappush(agenda, (weight, waiting_for))
+            paths.append(best)
+        return paths
+
+    # This function returns the events (see serialize.py) of an entry that need not be complete, as far as it
+    # goes: its l.h.s. is opened, followed by its children so far, but not closed. Also returns the weight of
+    # the children (the entry's rule is not known yet, so its weight is not included).
+    def partial_events(self, entry):
+        state = self.chart.entry(entry)[0]
+        symbols = [] # the r.h.s. so far, on the path from the trie's root to the state
+        x = state
+        while self.grammar.state_parent[x] >= 0:
+            symbols.insert(0, self.grammar.state_symbol[x])
+            x = self.grammar.state_parent[x]
+        children = []
         ref_entry = entry
-        while ref_entry is not None:
-            list_entries.append(ref_entry)
-            ref_entry = ref_entry.horiz_backpointer
-
-        # now walk through this list printing all the of subtrees
-        index_rhs = 0
-        while len(list_entries) > 0:
-            sub_entry = list_entries.pop()
-            if sub_entry.vert_backpointer is None:
-                print(gr_rule.rhs[index_rhs], end=" ")
+        if len(symbols) == 0: # a predicted entry has no children yet
+            ref_entry = NO_ITEM
+        while ref_entry != NO_ITEM: # follow the horizontal backpointers, from the last child to the first
+            horiz_backpointer, vert_backpointer, vert_chain = self.chart.entry(ref_entry)[4:7]
+            children.append((vert_backpointer, vert_chain))
+            ref_entry = horiz_backpointer
+        children.reverse()
+
+        events = [(serialize.OPEN, self.grammar.symbols[self.grammar.state_lhs[state]])]
+        weight = 0.0
+        for index in range(0, len(children)):
+            vert_backpointer, vert_chain = children[index]
+            if vert_backpointer == NO_ITEM:
+                events.append((serialize.WORD, self.grammar.symbols[symbols[index]]))
             else:
-                self.print_entry(sub_entry.vert_backpointer)
-            index_rhs += 1
-
-        print(")", end="")
+                child_events, child_weight = self.tree_events(vert_backpointer, vert_chain)
+                events.extend(child_events)
+                weight += child_weight
+        return events, weight
+
+    # This function fills column i_col of the chart from its agenda
+    def process_column(self, i_col):
+        column = self.chart.columns[i_col]
+        agenda = self.agendas[i_col]
+
+        # Knuth's algorithm: each state is put in the chart and processed in order of increasing weight.
+        # Weights are never negative, so a state's weight is final by the time it leaves the agenda.
+        num_popped = 0
+        while len(agenda) > 0:  # the agenda can have additional states added during this loop
+            if self.budget is not None and num_popped % BUDGET_CHECK_INTERVAL == 0:
+                status = self.check_budget(i_col, self.deadline)
+                if status != PARSE_OK:
+                    self.abandon_parse(status)
+                    return
+            num_popped += 1
+
+            weight, order, tuple_version_of_state = heapq.heappop(agenda)
+            i_row = self.finalize(tuple_version_of_state, order)
+            if i_row is None: # i.e. if this derivation was superseded by a lower-weight one
+                continue
+
+            state = column.rule_index[i_row]
+
+            # a trie state can be complete (a rule ends there) and incomplete (longer rules go on) at once
+            # we need to run ATTACH (a/k/a COMPLETE), unless the unary closure already took care of it
+            if self.grammar.state_rule[state] != NO_RULE and \
+                    (not self.grammar.state_unary[state] or self.edges is not None):
+                self.attach(i_row, i_col)
+
+            # scanning waits for the next word to be fed (see feed())
+            for next_cat in self.grammar.state_predictions[state]: # a terminal can never be predicted
+                self.predictor(i_row, i_col, next_cat)
+        if self.beam is not None:
+            self.prune_column(i_col)
+        if self.stats is not None:
+            self.stats.items_per_column.append(len(column))
 
-
-    # This function does the actual printing
+    # This function actually parses a particular sentence
+    def parse(self, sentence):
+        self.begin()
+        for word in sentence.split():
+            if self.status != PARSE_OK:
+                break
+            self.feed(word)
+        self.finish()
+
+
+    # This function returns the rule of a complete entry, given its item id, and its children: one per r.h.s.
+    # symbol, either (item id, unary chain) of the child's entry or None for a terminal (see serialize.py)
+    def expand_entry(self, entry):
+        rule_index = self.grammar.state_rule[self.chart.entry(entry)[0]] # the concrete rule ending at the state
+        children = []
+        ref_entry = entry
+        while ref_entry != NO_ITEM: # follow the horizontal backpointers, from the last child to the first
+            horiz_backpointer, vert_backpointer, vert_chain = self.chart.entry(ref_entry)[4:7]
+            if vert_backpointer == NO_ITEM:
+                children.append(None)
+            else:
+                children.append((vert_backpointer, vert_chain))
+            ref_entry = horiz_backpointer
+        children.reverse()
+        return self.grammar_rules[rule_index], children
+
+    # This function returns the tree of an entry (wrapped in a unary chain, unless chain is NO_CHAIN) as a list
+    # of events (see serialize.py), with its weight added up in the order the rule-by-rule parser adds it up
+    # (the rule's weight first, then its children from left to right), so the printed weights agree with it.
+    def tree_events(self, entry, chain = NO_CHAIN):
+        return serialize.tree_events(self, entry, chain, self.expand_entry)
+
+
+    # This generator yields the parses of the sentence, best first, as pairs (events, weight).
+    # It only works when k_best was set before parsing; parses are worked out lazily, as they are asked for.
+    def k_best_events(self):
+        derivations = KBestDerivations(self)
+        for weight, node in derivations.parses():
+            yield serialize.tree_events(self, node, NO_CHAIN, derivations.expand)
+
+    # This generator yields the parses of the sentence, best first, as pairs (bracketed tree, weight)
+    def k_best_trees(self):
+        for events, weight in self.k_best_events():
+            yield serialize.to_bracket(events), weight
+
+    # This function does the actual printing, in self.output_format (see serialize.py).
+    # The whole output for the sentence is built first and then written at once.
     def print(self):
+        sys.stdout.write(self.format())
+
+    # This function returns what print() prints
+    def format(self):
+        # a sentence that ran out of budget has no chart left; report why instead of NONE
+        if self.status != PARSE_OK:
+            return serialize.format_failure(self.status, self.output_format, self.k_best is not None)
+
+        if self.k_best is not None: # all the trees of the sentence make up one group (see serialize.py)
+            return serialize.format_trees(list(itertools.islice(self.k_best_events(), self.k_best)),
+                                          self.output_format)
+
+        min_entry, min_chain = self.best_root()
+        if min_entry == NO_ITEM:
+            return serialize.format_failure("NONE", self.output_format)
+        events, min_weight = self.tree_events(min_entry, min_chain)
+        return serialize.format_tree(events, min_weight, self.output_format) # with the log-2 weight, as required for HW4
+
+    # This function returns the root of the best parse of the sentence as (item id, unary chain): the
+    # lowest-weight complete ROOT rule spanning the whole sentence, or complete constituent that becomes ROOT
+    # through a chain of unary rules. It returns (NO_ITEM, NO_CHAIN) if the sentence has no parse.
+    def best_root(self):
         # first, find all instances of ROOT in the final column
-        count_completions = 0
-        min_entry = None
+        min_entry = NO_ITEM
+        min_chain = NO_CHAIN
         min_weight = float('inf')
-        for entry in self.chart[len(self.chart)-1]:
-            if self.grammar_rules[entry.rule_index].lhs == "ROOT" and \
-                    entry.start_index == 0 and \
-                    entry.period_index == len(self.grammar_rules[entry.rule_index].rhs) and \
-                    not entry.is_null:
-                if entry.weight < min_weight:
-                    min_weight = entry.weight
-                    min_entry = entry
-        if min_entry is not None:
-            self.print_entry(min_entry)
-            count_completions += 1
-            print("\n" + str(min_entry.weight))  # print the log-2 weight, as required for HW4
-        if count_completions == 0:
-            print("NONE")
-        elif count_completions > 1:
-            print("ERROR: Multiple trees printed out; should have printed only one")
+        root_rules = set(self.grammar.rules_for("ROOT")) # only entries for these rules can be a full parse
+        root_chains = {} # nonterminal -> unary chain from ROOT down to it
+        for b in range(0, self.grammar.num_nonterminals):
+            for lhs, chain in self.grammar.unary_closure[b]:
+                if self.grammar.symbols[lhs] == "ROOT":
+                    root_chains[b] = chain
+        i_col = self.chart.num_columns - 1
+        column = self.chart.columns[i_col]
+        for i_row in range(0, len(column)):
+            state = column.rule_index[i_row]
+            rule_index = self.grammar.state_rule[state]
+            if rule_index != NO_RULE and not self.grammar.state_unary[state] and \
+                    column.start_index[i_row] == 0 and \
+                    not column.is_null[i_row]:
+                weight = column.weight[i_row] + self.grammar_rules[rule_index].weight
+                chain = root_chains.get(self.grammar.state_lhs[state], NO_CHAIN)
+                if chain != NO_CHAIN:
+                    weight = self.chain_weight(chain, weight)
+                elif rule_index not in root_rules:
+                    continue
+                if weight < min_weight:
+                    min_weight = weight
+                    min_entry = self.chart.item_id(i_col, i_row)
+                    min_chain = chain
+        return min_entry, min_chain
+
+
+# The parsing engines that --engine can choose from; each is a class with the same
+# read_grammar_rules(), parse() and print() methods
+ENGINES = {"earley": EarleyParser, "cky": CKYParser}
+
+# The parser owned by a batch worker process; each worker loads the grammar once, in init_batch_worker()
+batch_parser = None
+
+# This function runs once in every batch worker process, when the pool starts it
+def init_batch_worker(grammar_filename, budget = None, beam = None, engine = "earley", k_best = None,
+                      output_format = "bracket", collect_stats = False):
+    global batch_parser
+    batch_parser = ENGINES[engine]()
+    batch_parser.read_grammar_rules(grammar_filename)
+    if engine == "earley":
+        batch_parser.budget = budget
+        batch_parser.beam = beam
+        batch_parser.k_best = k_best
+        batch_parser.output_format = output_format
+        batch_parser.collect_stats = collect_stats
+
+# This function parses one (index, sentence) job in a batch worker process.
+# It returns the index with exactly the text that parse() and print() would have written to stdout, and the
+# sentence's --stats line (or None if the parser does not collect stats).
+def parse_batch_job(job):
+    index, sentence = job
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        batch_parser.parse(sentence)
+        batch_parser.print()
+    stats = None
+    if getattr(batch_parser, "stats", None) is not None:
+        stats = stats_line(batch_parser, index)
+    return index, output.getvalue(), stats
+
+# This function parses a list of sentences on a pool of worker processes.
+# Sentences are handed out longest first, so a long sentence does not end up alone at the tail of the
+# batch, but results are still written in input order, each as soon as every earlier one has been written.
+def parse_batch(grammar_filename, sentences, num_workers, budget = None, beam = None, engine = "earley",
+                k_best = None, output_format = "bracket", collect_stats = False):
+    jobs = [(i, sentences[i]) for i in range(0, len(sentences))]
+    jobs.sort(key=lambda job: len(job[1].split()), reverse=True)
+
+    finished = {} # index -> (output, stats line) of sentences that are done but cannot be written yet
+    next_index = 0 # index of the next sentence to write
+    with multiprocessing.Pool(num_workers, initializer=init_batch_worker, initargs=(grammar_filename, budget, beam, engine, k_best, output_format, collect_stats)) as pool:
+        for index, output, stats in pool.imap_unordered(parse_batch_job, jobs):
+            finished[index] = (output, stats)
+            while next_index in finished:
+                output, stats = finished.pop(next_index)
+                sys.stdout.write(output)
+                if stats is not None:
+                    sys.stderr.write(stats)
+                next_index += 1
+            sys.stdout.flush()
+
+
+# This function returns the --stats line of the sentence the parser parsed last (the index-th of the input):
+# its counters (see ParseStats) as one line of JSON
+def stats_line(parser, index):
+    record = {"sentence": index, "words": len(parser.words), "status": parser.status}
+    record.update(parser.stats.to_dict())
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+# This function adds the per-sentence budget options to a command line parser
+def add_budget_arguments(arg_parser):
+    arg_parser.add_argument("--max-seconds", type=float, default=None,
+                            help="give up on a sentence after this many seconds and print TIMEOUT")
+    arg_parser.add_argument("--max-items", type=int, default=None,
+                            help="give up on a sentence whose chart exceeds this many entries and print OVER BUDGET")
+    arg_parser.add_argument("--max-column-items", type=int, default=None,
+                            help="give up on a sentence when one chart column exceeds this many entries "
+                                 "and print OVER BUDGET")
+
+# This function returns the ParseBudget asked for on the command line, or None if there is no limit
+def budget_from_arguments(args):
+    if args.max_seconds is None and args.max_items is None and args.max_column_items is None:
+        return None
+    return ParseBudget(args.max_seconds, args.max_items, args.max_column_items)
+
+
+# This function adds the beam search options to a command line parser
+def add_beam_arguments(arg_parser):
+    arg_parser.add_argument("--beam-threshold", type=float, default=None,
+                            help="prune chart entries whose weight is more than this many bits above "
+                                 "the best entry of their column")
+    arg_parser.add_argument("--beam-size", type=int, default=None,
+                            help="keep at most this many of the lowest-weight entries per column")
+
+# This function returns the Beam asked for on the command line, or None for exhaustive search
+def beam_from_arguments(args):
+    if args.beam_threshold is None and args.beam_size is None:
+        return None
+    return Beam(args.beam_threshold, args.beam_size)
+
+# This function parses the sentences both exhaustively and with the parser's beam, printing the beam's
+# output as usual, and then reports on stderr how often the beam's best tree differs from the exact one
+def check_beam(parser, sentences):
+    beam = parser.beam
+    num_different = 0
+    num_lost = 0 # sentences that have a parse, but none within the beam
+    for sentence in sentences:
+        outputs = []
+        for search in (None, beam):
+            parser.beam = search
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                parser.parse(sentence)
+                parser.print()
+            outputs.append(output.getvalue())
+        exact, beamed = outputs
+        sys.stdout.write(beamed)
+        if exact.split("\n")[0] != beamed.split("\n")[0]: # compare the trees, not the weights' last digits
+            num_different += 1
+            if beamed.startswith("NONE") and not exact.startswith("NONE"):
+                num_lost += 1
+    parser.beam = beam
+    print("beam check: " + str(num_different) + " of " + str(len(sentences)) +
+          " trees differ from exhaustive search (" + str(num_lost) + " parses lost)", file=sys.stderr)
 
 
 # This main function coordinates all the code to run
 def main():
-    if len(sys.argv) != 3:
-        sys.exit("Usage: basic_earley grammar.gr sentences.sen")
-    parser = EarleyParser()
-    parser.read_grammar_rules(sys.argv[1])
-
-    sen_file = open(sys.argv[2])  # open .SEN file
-    for sentence in sen_file:
-        if len(sentence.strip()) > 0:
-            parser.parse(sentence)
+    arg_parser = argparse.ArgumentParser(usage="%(prog)s grammar.gr sentences.sen [--engine E] [-j N] [-k N] [--format F] [--stats] [budget options] [beam options]")
+    arg_parser.add_argument("grammar_filename")
+    arg_parser.add_argument("sentences_filename")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=1,
+                            help="parse sentences on a pool of N worker processes (default: 1, no pool)")
+    arg_parser.add_argument("--engine", choices=sorted(ENGINES.keys()), default="earley",
+                            help="parsing algorithm: earley (default) or cky (vectorized, on a binarized grammar)")
+    arg_parser.add_argument("-k", "--k-best", type=int, default=None,
+                            help="print the N lowest-weight trees of each sentence, best first, as one group per sentence "
+                                 "(see serialize.py; default: 1)")
+    arg_parser.add_argument("--format", dest="output_format", choices=serialize.FORMATS, default="bracket",
+                            help="how to write trees: bracket (default), json (nested lists) or flat "
+                                 "(preorder labels and parent indices); see serialize.py")
+    add_budget_arguments(arg_parser)
+    add_beam_arguments(arg_parser)
+    arg_parser.add_argument("--beam-check", action="store_true",
+                            help="also parse without the beam and report how often the best tree differs")
+    arg_parser.add_argument("--report-dead-entries", action="store_true",
+                            help="report on stderr how many chart entries were replaced by cheaper duplicates")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="write the parser's work counters for each sentence to stderr, one line of JSON "
+                                 "per sentence (see ParseStats)")
+    args = arg_parser.parse_args()
+    budget = budget_from_arguments(args)
+    beam = beam_from_arguments(args)
+    if args.engine != "earley" and (budget is not None or beam is not None or args.beam_check or
+                                    args.report_dead_entries or args.stats or args.k_best is not None or
+                                    args.output_format != "bracket"):
+        arg_parser.error("-k, --format, --stats, budget, beam and dead-entry options only apply to --engine earley")
+    if args.stats and args.beam_check:
+        arg_parser.error("--stats cannot be combined with --beam-check, which parses every sentence twice")
+    if args.k_best is not None and args.k_best < 1:
+        arg_parser.error("-k must be at least 1")
+
+    with open(args.sentences_filename) as sen_file:  # open .SEN file
+        sentences = [sentence for sentence in sen_file if len(sentence.strip()) > 0]
+
+    if args.jobs > 1 and not args.beam_check:
+        parse_batch(args.grammar_filename, sentences, args.jobs, budget, beam, args.engine, args.k_best,
+                    args.output_format, args.stats)
+        return
+
+    parser = ENGINES[args.engine]()
+    parser.read_grammar_rules(args.grammar_filename)
+    if args.engine == "earley":
+        parser.budget = budget
+        parser.beam = beam
+        parser.k_best = args.k_best
+        parser.output_format = args.output_format
+        parser.collect_stats = args.stats
+    if args.beam_check:
+        check_beam(parser, sentences)
+        return
+    output = io.StringIO() # the output of the sentences not yet written
+    for index in range(0, len(sentences)):
+        with contextlib.redirect_stdout(output):
+            parser.parse(sentences[index])
             parser.print()
-
-main() # starts execution
+        if args.stats:
+            sys.stderr.write(stats_line(parser, index))
+        if (index + 1) % OUTPUT_BATCH_SIZE == 0:
+            sys.stdout.write(output.getvalue())
+            output = io.StringIO()
+    sys.stdout.write(output.getvalue())
+    if args.report_dead_entries:
+        print("dead entries: " + str(parser.num_dead_entries), file=sys.stderr)
+
+if __name__ == "__main__":
+    main() # starts execution
@@ -0,0 +1,122 @@
+'''
+Authors: Aaron Mueller, Andrew Blair-Stanek
+Date: 24 October 2018
+Course: Natural Language Processing
+Instructor: Jason Eisner
+Assignment: HW4 -- Parsing
+'''
+# Long-lived parse server: loads a grammar once and parses newline-delimited sentences sent over a
+# local Unix or TCP socket with the EarleyParser from parse.py.
+#
+# Protocol: the client sends one sentence per line. For every line, in order, the server sends back
+# exactly what parse.py prints for that sentence: either the bracketed tree on one line followed by
+# its weight on the next, or a single line: NONE, TIMEOUT or OVER BUDGET (when the budget options are
+# used), or ERROR if the parser failed on the sentence.
+#
+# Parsing is CPU-bound, so it happens on a pool of worker processes (each holding its own warm copy of
+# the grammar). At most --max-pending sentences are queued or parsing at once across all clients; when
+# that limit is reached the server stops reading from sockets, so clients feel the backpressure.
+
+import sys
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from parse import init_batch_worker, parse_batch_job, add_budget_arguments, budget_from_arguments
+
+# This class represents the server: the pool of parsing processes plus the limit on pending sentences
+class ParseServer:
+    def __init__(self, grammar_filename, num_workers, max_pending, budget = None):
+        self.num_workers = num_workers
+        self.pool = ProcessPoolExecutor(num_workers, initializer=init_batch_worker,
+                                        initargs=(grammar_filename, budget))
+        self.pending_slots = asyncio.Semaphore(max_pending)
+
+    # Make every worker process start up and load the grammar before the first client connects
+    async def warm_up(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, parse_batch_job, (0, ""))
+                               for x in range(0, self.num_workers)])
+
+    # Handles one client connection: reads sentences and queues their parses, in order
+    async def handle_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        responses = asyncio.Queue() # futures for the parses of this client's sentences, in input order
+        writer_task = asyncio.create_task(self.write_responses(responses, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if len(line) == 0: # the client closed its end of the connection
+                    break
+
+                # wait for a free slot before reading on; this is where backpressure comes from
+                await self.pending_slots.acquire()
+                future = loop.run_in_executor(self.pool, parse_batch_job, (0, line.decode("utf-8", "replace")))
+                future.add_done_callback(lambda f: self.pending_slots.release())
+                await responses.put(future)
+        except (ValueError, ConnectionError): # ValueError is a line longer than the stream's limit
+            pass
+        finally:
+            await responses.put(None) # tells write_responses() that no more sentences are coming
+            await writer_task
+            writer.close()
+
+    # Writes the responses of one client, in the order its sentences arrived
+    async def write_responses(self, responses, writer):
+        while True:
+            future = await responses.get()
+            if future is None:
+                break
+            try:
+                index, output, stats = await future
+            except Exception:
+                output = "ERROR\n"
+            try:
+                writer.write(output.encode("utf-8"))
+                await writer.drain() # do not buffer without bound for a client that reads slowly
+            except ConnectionError:
+                pass # the client went away; keep draining futures so their slots are released
+
+    # Starts listening on a Unix socket (if unix_path is given) or on a TCP host and port
+    async def serve(self, unix_path, host, port):
+        await self.warm_up()
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle_client, path=unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host=host, port=port)
+        for sock in server.sockets:
+            print("Listening on " + str(sock.getsockname()), file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+
+# This main function coordinates all the code to run
+def main():
+    arg_parser = argparse.ArgumentParser(
+        usage="%(prog)s grammar.gr (--unix PATH | --port PORT) [--host HOST] [--workers N] [--max-pending M] "
+              "[budget options]")
+    arg_parser.add_argument("grammar_filename")
+    arg_parser.add_argument("--unix", dest="unix_path", default=None, help="listen on this Unix socket")
+    arg_parser.add_argument("--host", default="127.0.0.1", help="TCP address to listen on (default: 127.0.0.1)")
+    arg_parser.add_argument("--port", type=int, default=None, help="TCP port to listen on")
+    arg_parser.add_argument("--workers", type=int, default=2, help="number of parsing processes (default: 2)")
+    arg_parser.add_argument("--max-pending", type=int, default=64,
+                            help="most sentences queued or parsing at once, over all clients (default: 64)")
+    add_budget_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    if (args.unix_path is None) == (args.port is None):
+        arg_parser.error("give exactly one of --unix and --port")
+
+    async def run():
+        server = ParseServer(args.grammar_filename, args.workers, args.max_pending, budget_from_arguments(args))
+        try:
+            await server.serve(args.unix_path, args.host, args.port)
+        finally:
+            server.pool.shutdown(cancel_futures=True)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main() # starts execution
@@ -3,6 +3,8 @@
 import sys
 import numpy
 import math
+import argparse
+import itertools
 
 # This class represents a single grammar rule read in from .GR file
 class GrRule:
@@ -31,19 +33,158 @@ class GrRule:
 
 # This class represents a single entry (i.e., the rule, the start index, and the period index)
 class Entry:
-    def __init__(self, rule_index, start_index, period_index, weight, backpointers_to_copy = None):
+    def __init__(self, rule_index, start_index, period_index, weight):
         self.rule_index = rule_index
         self.start_index = start_index
         self.period_index = period_index
-        self.weight = weight
-        self.backpointers = []  # list of list of *references* to entries upon which this is built
+        self.weight = weight # lowest weight found so far (the rule's weight plus its children's)
+        self.end_index = None # the column of the chart holding the entry, set by enqueue()
+        # Every way of getting this entry, as a list of links (previous entry, child): the previous entry is the
+        # same rule with the period one symbol further left, and the child is the complete entry for the symbol
+        # just left of the period (None for a terminal). Predicted entries, with the period at the start, have none.
+        # The entries are shared, never copied, so a later alternative of any of them is seen by all its users.
+        self.links = []
         self.debug_info = None
-        if backpointers_to_copy is None:
-            self.backpointers.append([]) # backpointers is a list of lists of references pointing back to entries
-        else: # copies over all backpointers
-            for list_backpointers in backpointers_to_copy:
-                new_backpointers = list_backpointers.copy()
-                self.backpointers.append(new_backpointers)
+
+
+# This class represents a packed parse forest over a filled chart: one node per (symbol, start, end) that
+# has a complete entry, whose alternatives are the complete entries for that symbol and span (one per
+# rule, each of them with all its links). A forest of exponentially many trees takes only as much memory
+# as the chart, and counting its trees or finding the best one takes time linear in the chart.
+class ParseForest:
+    def __init__(self, parser, num_words):
+        self.grammar_rules = parser.grammar_rules
+        self.chart = parser.chart
+        self.num_words = num_words
+        self.nodes = {} # dictionary (i.e. hash table) from (symbol, start, end) to its complete entries
+        for column in self.chart:
+            for entry in column:
+                if entry.period_index == len(self.grammar_rules[entry.rule_index].rhs):
+                    key = (self.grammar_rules[entry.rule_index].lhs, entry.start_index, entry.end_index)
+                    if key not in self.nodes:
+                        self.nodes[key] = []
+                    self.nodes[key].append(entry)
+
+    # Returns the key of the node for the child of a link of an entry
+    def child_node(self, entry, child):
+        return (self.grammar_rules[child.rule_index].lhs, child.start_index, entry.end_index)
+
+    # Returns the key of the root node of the forest, or None if the sentence has no parse
+    def root(self):
+        key = ("ROOT", 0, self.num_words)
+        if key not in self.nodes:
+            return None
+        return key
+
+    # This function returns the number of trees in the forest (float('inf') if a cycle of unary rules makes
+    # infinitely many), without building any of them
+    def count_trees(self):
+        if self.root() is None:
+            return 0
+        counts = {} # node key or entry -> number of trees (or of ways to get the entry); None while on the stack
+        return self.count_node(self.root(), counts)
+
+    def count_node(self, key, counts):
+        if key in counts:
+            if counts[key] is None: # the node is inside its own subtree
+                return float('inf')
+            return counts[key]
+        counts[key] = None
+        total = 0
+        for entry in self.nodes[key]:
+            total += self.count_entry(entry, counts)
+        counts[key] = total
+        return total
+
+    def count_entry(self, entry, counts):
+        if len(entry.links) == 0: # a predicted entry, with its period at the start
+            return 1
+        if entry in counts:
+            return counts[entry]
+        total = 0
+        for previous, child in entry.links:
+            count = self.count_entry(previous, counts)
+            if child is not None:
+                count *= self.count_node(self.child_node(entry, child), counts)
+            total += count
+        counts[entry] = total
+        return total
+
+    # This function returns the lowest-weight tree of the forest and its weight, as a pair (bracketed tree,
+    # weight), or None if the sentence has no parse.
+    # The weights of all entries are relaxed in chart order until none improves, which is correct even when the
+    # forest has cycles, since weights are never negative.
+    def best_tree(self):
+        if self.root() is None:
+            return None
+        unknown = (float('inf'), None)
+        best = {} # entry -> (lowest weight of its r.h.s. so far, best link); node key -> (weight, best entry)
+        improved = True
+        while improved:
+            improved = False
+            for column in self.chart:
+                for entry in column:
+                    if len(entry.links) == 0:
+                        best[entry] = (0.0, None)
+                    for previous, child in entry.links:
+                        weight = best.get(previous, unknown)[0]
+                        if child is not None:
+                            weight += best.get(self.child_node(entry, child), unknown)[0]
+                        if weight < best.get(entry, unknown)[0]:
+                            best[entry] = (weight, (previous, child))
+                            improved = True
+                    gr_rule = self.grammar_rules[entry.rule_index]
+                    if entry.period_index == len(gr_rule.rhs) and entry in best:
+                        key = (gr_rule.lhs, entry.start_index, entry.end_index)
+                        weight = gr_rule.weight + best[entry][0]
+                        if weight < best.get(key, unknown)[0]:
+                            best[key] = (weight, entry)
+        if self.root() not in best:
+            return None
+        return self.best_subtree(self.root(), best), best[self.root()][0]
+
+    # This recursive helper function returns the best tree of a node, as a bracketed string
+    def best_subtree(self, key, best):
+        entry = best[key][1]
+        children = []
+        while best[entry][1] is not None: # follow the best links from right to left
+            previous, child = best[entry][1]
+            if child is None:
+                children.append(self.grammar_rules[entry.rule_index].rhs[entry.period_index - 1] + " ")
+            else:
+                children.append(self.best_subtree(self.child_node(entry, child), best))
+            entry = previous
+        children.reverse()
+        return "(" + key[0] + " " + "".join(children) + ")"
+
+    # This generator yields the trees of the forest one at a time, as bracketed strings, building each one only
+    # when it is asked for. Trees that use a node inside its own subtree (through a cycle of unary rules) are
+    # skipped, so there are finitely many.
+    def trees(self):
+        if self.root() is not None:
+            yield from self.node_trees(self.root(), set())
+
+    def node_trees(self, key, path):
+        if key in path:
+            return
+        path.add(key)
+        for entry in self.nodes[key]:
+            for children in self.entry_children(entry, path):
+                yield "(" + key[0] + " " + "".join(children) + ")"
+        path.remove(key)
+
+    # This generator yields the lists of subtree strings of the r.h.s. up to an entry's period
+    def entry_children(self, entry, path):
+        if len(entry.links) == 0:
+            yield []
+            return
+        for previous, child in entry.links:
+            for left in self.entry_children(previous, path):
+                if child is None:
+                    yield left + [self.grammar_rules[entry.rule_index].rhs[entry.period_index - 1] + " "]
+                else:
+                    for subtree in self.node_trees(self.child_node(entry, child), path):
+                        yield left + [subtree]
 
 
 # This class represents the entire parser
@@ -53,6 +194,7 @@ class EarleyParser:
         self.num_rules = -1
         self.chart = None
         self.states_added = None
+        self.attached = None # dictionary (i.e. hash table) of the (l.h.s., start, end) already attached
         self.print_build_info = False # Useful setting to turn to true for debugging
 
     # Read grammar rules from an external file.
@@ -73,24 +215,27 @@ class EarleyParser:
     def predictor(self, state, i_col, next_cat):
         for i_rule in range(0, len(self.grammar_rules)):
             if self.grammar_rules[i_rule].lhs == next_cat:
-                new_entry = Entry(i_rule, i_col, 0)
+                new_entry = Entry(i_rule, i_col, 0, self.grammar_rules[i_rule].weight)
                 self.enqueue(new_entry, i_col, "PREDICTOR") # attempt to add new state, if not already added
 
 
     # This is the second operator in Earley (out of three), see J&M p.444
     # It puts a new completed entry in the NEXT column of the chart
     def scanner(self, state, i_col):
-        new_entry = Entry(state.rule_index, state.start_index, state.period_index+1, state.backpointers)
-        for backpointer_list in new_entry.backpointers:
-            backpointer_list.append(None) # keep an empty entry for non-terminals, which is what scanner() handles
-        self.enqueue(new_entry, i_col +1, "SCANNER")
+        new_entry = Entry(state.rule_index, state.start_index, state.period_index+1, state.weight)
+        self.enqueue(new_entry, i_col +1, "SCANNER", (state, None)) # no child entry for a terminal
 
 
     # This is the third operator in Earley, called "Completer" by J&M p.444
     # It goes back to PRIOR chart entries to find "customers" for a completed state
+    # All the complete entries with the same l.h.s. and span are one node of the forest, so only the first
+    # one of them is attached; the links to it stand for the others too.
     def attach(self, state, i_col):
         match_seeking = self.grammar_rules[state.rule_index].lhs
         icol2 = state.start_index
+        if (match_seeking, icol2, i_col) in self.attached:
+            return
+        self.attached[(match_seeking, icol2, i_col)] = True
         for irow2 in range(0, len(self.chart[icol2])):
             entry2 = self.chart[icol2][irow2]
             if entry2.period_index < len(self.grammar_rules[entry2.rule_index].rhs):
@@ -98,46 +243,30 @@ class EarleyParser:
                 possible_match = self.grammar_rules[entry2.rule_index].rhs[entry2.period_index]
                 if possible_match == match_seeking:  # if this is true, we have a "customer" to "attach"
                     new_entry = Entry(entry2.rule_index, entry2.start_index,
-                                      entry2.period_index + 1, entry2.backpointers)
-                    for backpointer_list in new_entry.backpointers:
-                        backpointer_list.append(state) # adds backpointer
-
-                    self.enqueue(new_entry, i_col, "ATTACH")
+                                      entry2.period_index + 1, entry2.weight + state.weight)
+                    self.enqueue(new_entry, i_col, "ATTACH", (entry2, state))
 
 
     # This is a crucial helper function in Earley, see J&M p.444
     # It tries to add a state to the chart a column i_col.
-    # It only adds that state if it has not already been added in i_col.
-    def enqueue(self, state, column, calling_function):
+    # It only adds that state if it has not already been added in i_col; otherwise the state's link is
+    # just one more way of getting the existing entry, so it is added to the existing entry's links.
+    def enqueue(self, state, column, calling_function, link = None):
         tuple_version_of_state = (state.rule_index, state.start_index, state.period_index)
 
-        if tuple_version_of_state in self.states_added[column] and calling_function == "ATTACH":
+        if tuple_version_of_state in self.states_added[column]:
             existing_state = self.states_added[column][tuple_version_of_state]
-            if len(state.backpointers) > 1:
-                print("ERROR - incorrect assumption about backpointers being added")
-            if existing_state.period_index == len(self.grammar_rules[existing_state.rule_index].rhs):
-                #if weight(state.rule) + weight(state.backpointers[0]) > weight(existing_state.rule) + weight(existing_state.backpointers[0]):
-                existing_weight = float('inf')
-                for backpointer_list in existing_state.backpointers:
-                    bp_weight = self.grammar_rules[existing_state.rule_index].weight + \
-                        sum([self.grammar_rules[bp.rule_index].weight for bp in backpointer_list])
-                    existing_weight = min(existing_weight, bp_weight)
-                new_weight = self.grammar_rules[state.rule_index].weight + \
-                    sum([self.grammar_rules[bp.rule_index].weight for bp in state.backpointers[0]])
-                if new_weight > existing_weight:
-                    existing_state.backpointers = [state.backpointers[0]]
+            if link is not None:
+                existing_state.links.append(link)
+                existing_state.weight = min(existing_state.weight, state.weight)
 
-            if self.print_build_info:
-                print("ADDED BACKPOINTER TO " + existing_state.debug_info)
-                for i in range(0, len(existing_state.backpointers)):
-                    print("    Backpointers List " + str(i))
-                    for bp in existing_state.backpointers[i]:
-                        if bp is not None:
-                            print("        " + bp.debug_info)
-                        else:
-                            print("        None")
-
-        elif tuple_version_of_state not in self.states_added[column]:
+                if self.print_build_info:
+                    print("ADDED LINK TO " + existing_state.debug_info)
+
+        else:
+            if link is not None:
+                state.links.append(link)
+            state.end_index = column
             self.chart[column].append(state)
             self.states_added[column][tuple_version_of_state] = state
 
@@ -149,20 +278,11 @@ class EarleyParser:
                 print(s)
                 state.debug_info = s
 
-                if len(state.backpointers[0]) > 0:
-                    for i in range(0, len(state.backpointers)):
-                        print("    Backpointers List " + str(i))
-                        for bp in state.backpointers[i]:
-                            if bp is not None:
-                                print("        " + bp.debug_info)
-                            else:
-                                print("        None")
-
     # This function starts the first column with all possible expansions of ROOT
     def add_ROOT_expansions(self):
         for i in range(0, len(self.grammar_rules)):
             if self.grammar_rules[i].lhs == "ROOT":
-                self.enqueue(Entry(i, 0, 0), 0, "DUMMY START STATE")
+                self.enqueue(Entry(i, 0, 0, self.grammar_rules[i].weight), 0, "DUMMY START STATE")
 
 
     def parse(self, sentence):
@@ -170,6 +290,7 @@ class EarleyParser:
 
         self.chart = [[] for x in range(0, len(words)+1)] # create the chart
         self.states_added = [{} for x in range(0, len(words)+1)] # list of dictionaries for state used
+        self.attached = {}
         self.add_ROOT_expansions() # add all ROOT rules to the start of the chart
 
         for i_col in range(0, len(words)+1):  # iterates over columns in Earley chart
@@ -199,64 +320,46 @@ class EarleyParser:
                 i_row += 1
 
 
-    # This recursive helper function prints the subtree
-    def print_subtree(self, cur_entry):
-        trees = []
-        gr_rule = self.grammar_rules[cur_entry.rule_index]
-        if len(cur_entry.backpointers[0]) == 0: # We are at a terminal
-            trees.append("( " + gr_rule.lhs + " " + gr_rule.rhs[0] + ")")
-        else: # not a non-terminal, so we need to go back through backpointers
-            for bpl in cur_entry.backpointers:
-                trees_bpl = []  # this will contain list of strings generated by just *bpl*'s backpointers
-                trees_bpl.append("(" + gr_rule.lhs + " ")
-                for i in range(0, len(gr_rule.rhs)):
-                    cur_backpointer = bpl[i]
-                    if cur_backpointer is None:
-                        for j in range(0,len(trees_bpl)):
-                            trees_bpl[j] += gr_rule.rhs[i] + " "
-                    else:
-                        subtrees = self.print_subtree(cur_backpointer)
-                        if len(subtrees) == 1:
-                            for j in range(0,len(trees_bpl)):
-                                trees_bpl[j] = trees_bpl[j] + subtrees[0]
-                        else: # this is if there are multiple subtrees
-                            new_trees_bpl = []
-                            for j in range(0,len(trees_bpl)):
-                                for k in range(0, len(subtrees)):
-                                    new_trees_bpl.append(trees_bpl[j] + subtrees[k])
-                            trees_bpl = new_trees_bpl
-                for j in range(0,len(trees_bpl)):
-                    trees_bpl[j] = trees_bpl[j] + ")"
-                trees = trees + trees_bpl
-        return trees
-
-    # This function does the actual printing
-    def print(self):
-        # first, find all instances of ROOT in the final column
-        count_ROOT = 0
-        for entry in self.chart[len(self.chart)-1]:
-            if self.grammar_rules[entry.rule_index].lhs == "ROOT" and \
-                    entry.start_index == 0 and \
-                    entry.period_index == len(self.grammar_rules[entry.rule_index].rhs):
-                count_ROOT += 1
-                trees = self.print_subtree(entry)
-                for s in trees:
-                    print(s)
-#        print("\ncount_ROOT = " + str(count_ROOT))
+    # This function returns the packed parse forest of the sentence just parsed
+    def forest(self):
+        return ParseForest(self, len(self.chart) - 1)
+
+    # This function does the actual printing: every parse tree, one per line, or at most max_trees of them.
+    # The trees are enumerated from the packed forest one at a time, so they are never all held in memory.
+    def print(self, max_trees = None):
+        for tree in itertools.islice(self.forest().trees(), max_trees):
+            print(tree)
 
 
 # This main function coordinates all the code to run
 def main():
-    if len(sys.argv) != 3:
-        sys.exit("Usage: basic_earley grammar.gr sentences.sen")
+    arg_parser = argparse.ArgumentParser(usage="%(prog)s grammar.gr sentences.sen [--count | --best] [--max-trees N]")
+    arg_parser.add_argument("grammar_filename")
+    arg_parser.add_argument("sentences_filename")
+    arg_parser.add_argument("--count", action="store_true", help="print only the number of parse trees")
+    arg_parser.add_argument("--best", action="store_true", help="print only the lowest-weight tree and its weight")
+    arg_parser.add_argument("--max-trees", type=int, default=None, help="print at most this many trees per sentence")
+    args = arg_parser.parse_args()
+
     parser = EarleyParser()
-    parser.read_grammar_rules(sys.argv[1])
+    parser.read_grammar_rules(args.grammar_filename)
 
-    sen_file = open(sys.argv[2])  # open .SEN file
+    sen_file = open(args.sentences_filename)  # open .SEN file
     for sentence in sen_file:
         if len(sentence.strip()) > 0:
             print("***** PARSING SENTENCE: " + sentence)
             parser.parse(sentence)
-            parser.print()
-
-main() # starts execution
+            if args.count:
+                print(parser.forest().count_trees())
+            elif args.best:
+                best = parser.forest().best_tree()
+                if best is None:
+                    print("NONE")
+                else:
+                    print(best[0])
+                    print(best[1])
+            else:
+                parser.print(args.max_trees)
+
+if __name__ == "__main__":
+    main() # starts execution
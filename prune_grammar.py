@@ -0,0 +1,208 @@
+'''
+Authors: Aaron Mueller, Andrew Blair-Stanek
+Date: 24 October 2018
+Course: Natural Language Processing
+Instructor: Jason Eisner
+Assignment: HW4 -- Parsing
+'''
+# Corpus-driven grammar pruning: keep only the rules that the best parses of a corpus actually use.
+#
+# Every sentence of a training corpus is parsed with parse.py's (Viterbi) Earley parser, and each rule is
+# counted once per use in a best tree, including the unary rules of the chains that parse.py applies in one
+# step. The rules used at least --min-count times are written to a reduced .GR file, along with every lexical
+# rule (r.h.s. of terminals only) unless --prune-lexical is given, since a small corpus cannot cover the
+# vocabulary. The probabilities of the rules kept for each l.h.s. are renormalized to sum to 1.
+# With --held-out, the sentences of another corpus are then parsed with both grammars, and the report gives
+# the reduced grammar's coverage (the sentences the full grammar parses that it still parses), how many of
+# its best trees are identical to the full grammar's, their labeled bracket F1, and the time both took.
+#
+#     python prune_grammar.py wallstreet.gr wallstreet.sen --held-out wallstreet_first.sen -o wallstreet_pruned.gr
+
+import os
+import time
+import argparse
+from chart import NO_ITEM, NO_CHAIN
+import parse
+import serialize
+from parse import EarleyParser, PARSE_OK
+
+# This function returns the rule indices used by the best parse of the sentence the parser parsed last (a
+# rule used twice appears twice), or None if it has no parse
+def best_tree_rules(parser):
+    if parser.status != PARSE_OK:
+        return None
+    root, chain = parser.best_root()
+    if root == NO_ITEM:
+        return None
+    rules = []
+    stack = [(root, chain)] # the tree is walked with a stack, as deep trees would hit the recursion limit
+    while len(stack) > 0:
+        entry, chain = stack.pop()
+        if chain != NO_CHAIN:
+            rules.extend(parser.grammar.unary_chains[chain])
+        rules.append(parser.grammar.state_rule[parser.chart.entry(entry)[0]])
+        gr_rule, children = parser.expand_entry(entry)
+        for child in children:
+            if child is not None:
+                stack.append(child)
+    return rules
+
+# This function returns the labeled brackets of the best parse of the sentence the parser parsed last, as a
+# dictionary (i.e. hash table) from (label, start word, end word) to how many times it occurs, or None if the
+# sentence has no parse
+def best_tree_brackets(parser):
+    if parser.status != PARSE_OK:
+        return None
+    root, chain = parser.best_root()
+    if root == NO_ITEM:
+        return None
+    events, weight = parser.tree_events(root, chain)
+    brackets = {}
+    open_brackets = [] # (label, start word) of the constituents open at this point
+    position = 0
+    for kind, text in events:
+        if kind == serialize.OPEN:
+            open_brackets.append((text, position))
+        elif kind == serialize.WORD:
+            position += 1
+        else:
+            label, start = open_brackets.pop()
+            brackets[(label, start, position)] = brackets.get((label, start, position), 0) + 1
+    return brackets
+
+# Returns the number of brackets in common between two dictionaries of brackets (see best_tree_brackets)
+def matching_brackets(brackets1, brackets2):
+    return sum([min(count, brackets2.get(bracket, 0)) for bracket, count in brackets1.items()])
+
+# This function returns the text of the reduced .GR file: the kept rules (a list of rule indices) in their
+# original order, with the probabilities of each l.h.s.' kept rules renormalized to sum to 1
+def reduced_grammar_text(grammar_rules, kept):
+    totals = {} # l.h.s. -> total probability of its kept rules
+    for rule_index in kept:
+        lhs = grammar_rules[rule_index].lhs
+        totals[lhs] = totals.get(lhs, 0.0) + grammar_rules[rule_index].prob
+    lines = []
+    for rule_index in sorted(kept):
+        gr_rule = grammar_rules[rule_index]
+        lines.append(str(gr_rule.prob / totals[gr_rule.lhs]) + "\t" + gr_rule.lhs + "\t" + " ".join(gr_rule.rhs) + "\n")
+    return "".join(lines)
+
+# This function parses the sentences with the parser, and returns the best trees' brackets (see
+# best_tree_brackets) and the total time taken
+def parse_sentences(parser, sentences):
+    trees = []
+    start = time.perf_counter()
+    for sentence in sentences:
+        parser.parse(sentence)
+        trees.append(best_tree_brackets(parser))
+    return trees, time.perf_counter() - start
+
+# Returns the sentences of a .SEN file
+def read_sentences(sentences_filename):
+    with open(sentences_filename) as sen_file:
+        return [sentence for sentence in sen_file if len(sentence.strip()) > 0]
+
+
+# This main function coordinates all the code to run
+def main():
+    arg_parser = argparse.ArgumentParser(
+        usage="%(prog)s grammar.gr train.sen [-o reduced.gr] [--min-count N] [--prune-lexical] "
+              "[--held-out held_out.sen] [--top N] [budget options]")
+    arg_parser.add_argument("grammar_filename")
+    arg_parser.add_argument("sentences_filename")
+    arg_parser.add_argument("-o", "--output", dest="output_filename", default=None,
+                            help="where to write the reduced grammar (default: the grammar's name + _pruned.gr)")
+    arg_parser.add_argument("--min-count", type=int, default=1,
+                            help="keep the rules used at least this many times in best parses (default: 1)")
+    arg_parser.add_argument("--prune-lexical", action="store_true",
+                            help="also drop the lexical rules (r.h.s. of terminals only) that no best parse used")
+    arg_parser.add_argument("--held-out", dest="held_out_filename", default=None,
+                            help="compare the reduced grammar's parses of these sentences with the full grammar's")
+    arg_parser.add_argument("--top", type=int, default=20, help="how many of the most used rules to list (default: 20)")
+    parse.add_budget_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    output_filename = args.output_filename
+    if output_filename is None:
+        output_filename = os.path.splitext(args.grammar_filename)[0] + "_pruned.gr"
+    if os.path.abspath(output_filename) == os.path.abspath(args.grammar_filename):
+        arg_parser.error("the reduced grammar would overwrite " + args.grammar_filename)
+    budget = parse.budget_from_arguments(args)
+
+    parser = EarleyParser()
+    parser.read_grammar_rules(args.grammar_filename)
+    parser.budget = budget
+    grammar_rules = parser.grammar_rules
+
+    # count the rules of the training corpus' best parses
+    counts = {} # rule index -> number of uses in best parses
+    sentences = read_sentences(args.sentences_filename)
+    num_parsed = 0
+    for sentence in sentences:
+        parser.parse(sentence)
+        rules = best_tree_rules(parser)
+        if rules is None:
+            continue
+        num_parsed += 1
+        for rule_index in rules:
+            counts[rule_index] = counts.get(rule_index, 0) + 1
+    if num_parsed == 0:
+        arg_parser.error("no sentence of " + args.sentences_filename + " has a parse")
+
+    kept = [rule_index for rule_index in range(0, len(grammar_rules)) if counts.get(rule_index, 0) >= args.min_count
+            or (not args.prune_lexical and not grammar_rules[rule_index].rhs_has_nonterminals)]
+    with open(output_filename, "w") as outfile:
+        outfile.write(reduced_grammar_text(grammar_rules, kept))
+
+    print("training: " + str(num_parsed) + " of " + str(len(sentences)) + " sentences parsed; " +
+          str(len(counts)) + " of " + str(len(grammar_rules)) + " rules used in best parses")
+    print("reduced grammar: " + str(len(kept)) + " of " + str(len(grammar_rules)) + " rules (" +
+          str(len([x for x in kept if grammar_rules[x].rhs_has_nonterminals])) + " of " +
+          str(len([x for x in grammar_rules if x.rhs_has_nonterminals])) + " non-lexical) written to " +
+          output_filename)
+    print("")
+    print("most used rules:")
+    ranked = sorted(counts.keys(), key=lambda rule_index: (-counts[rule_index], rule_index))
+    for rule_index in ranked[:args.top]:
+        print(str(counts[rule_index]).rjust(6) + "  #" + str(rule_index) + "  " + grammar_rules[rule_index].to_string())
+
+    if args.held_out_filename is None:
+        return
+    held_out = read_sentences(args.held_out_filename)
+    reduced_parser = EarleyParser()
+    reduced_parser.read_grammar_rules(output_filename)
+    reduced_parser.budget = budget
+    full_trees, full_seconds = parse_sentences(parser, held_out)
+    reduced_trees, reduced_seconds = parse_sentences(reduced_parser, held_out)
+
+    num_full = 0 # sentences the full grammar parses
+    num_covered = 0 # ... that the reduced grammar parses too
+    num_identical = 0 # ... with the same tree (up to the weights)
+    num_matching = 0 # brackets of the reduced grammar's trees that are also in the full grammar's
+    num_full_brackets = 0
+    num_reduced_brackets = 0
+    for i in range(0, len(held_out)):
+        if full_trees[i] is None:
+            continue
+        num_full += 1
+        num_full_brackets += sum(full_trees[i].values())
+        if reduced_trees[i] is None:
+            continue
+        num_covered += 1
+        num_reduced_brackets += sum(reduced_trees[i].values())
+        num_matching += matching_brackets(reduced_trees[i], full_trees[i])
+        if reduced_trees[i] == full_trees[i]:
+            num_identical += 1
+    precision = num_matching / float(num_reduced_brackets) if num_reduced_brackets > 0 else 0.0
+    recall = num_matching / float(num_full_brackets) if num_full_brackets > 0 else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+
+    print("")
+    print("held-out: " + str(len(held_out)) + " sentences, " + str(num_full) + " parsed by the full grammar " +
+          "in " + "%.3f" % full_seconds + " s; the reduced grammar took " + "%.3f" % reduced_seconds + " s")
+    print("coverage: " + str(num_covered) + " of " + str(num_full) + " still parsed")
+    print("identical best trees: " + str(num_identical) + " of " + str(num_full))
+    print("labeled brackets (the full grammar's trees as reference, unparsed sentences count as misses): "
+          "precision " + "%.3f" % precision + ", recall " + "%.3f" % recall + ", F1 " + "%.3f" % f1)
+
+if __name__ == "__main__":
+    main() # starts execution
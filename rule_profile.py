@@ -0,0 +1,230 @@
+'''
+Authors: Aaron Mueller, Andrew Blair-Stanek
+Date: 24 October 2018
+Course: Natural Language Processing
+Instructor: Jason Eisner
+Assignment: HW4 -- Parsing
+'''
+# Per-rule cost profiler for parse.py: which grammar rules (and l.h.s. symbols) the parser's work goes to.
+#
+# Every sentence of a corpus is parsed with a subclass of EarleyParser that charges the work it does to
+# grammar rules, and the totals over the corpus are ranked in a report:
+#     items     chart entries. An entry is a trie state, shared by all the rules that start with its
+#               r.h.s. prefix (see grammar.py), so it is split evenly among them.
+#     customers entries that attach_as() looked at while attaching a complete constituent, charged to the
+#               rule that was completed (or, for an attach through a unary chain, to the chain's top rule)
+#     matches   those customers that it advanced
+#     seconds   time spent in attach_as() (charged like customers), in predictor() (split among the rules of
+#               the predicted nonterminal, which all start out as one trie state) and in scanner() (split
+#               among the rules of the scanning entry's state)
+# Work charged to a rule is also charged to its l.h.s. The time of the rest of the parser (the agenda, the
+# beam, ...) is not charged to any rule; the report says how much of the parsing time was charged.
+#
+#     python rule_profile.py wallstreet.gr wallstreet.sen
+#     python rule_profile.py wallstreet.gr wallstreet.sen --sort items --top 50 --json wallstreet_profile.json
+
+import sys
+import json
+import time
+import argparse
+from grammar import NO_RULE
+from chart import NO_CHAIN
+import parse
+from parse import EarleyParser, PARSE_OK
+
+# The costs kept per rule and per l.h.s., in the order the report shows them
+COSTS = ["items", "customers", "matches", "seconds"]
+
+# This class is an EarleyParser that charges its work to grammar rules. The costs of all the sentences it
+# parses add up; costs() returns them per rule and per l.h.s.
+class ProfilingEarleyParser(EarleyParser):
+    def __init__(self):
+        EarleyParser.__init__(self)
+        self.state_rules = None # trie state -> indices of the rules whose r.h.s. starts with the state's prefix
+        self.rule_costs = None # rule index -> dictionary (i.e. hash table) from cost name to the total charged
+                               # to that rule alone
+        self.state_costs = {} # trie state -> dictionary from cost name to the total charged to the state, which
+                              # costs() splits among its rules (the root state of NP has hundreds of them, so
+                              # splitting every charge right away would swamp the parser's own time)
+        self.num_sentences = 0
+        self.parse_seconds = 0.0 # total time spent in parse(), charged to rules or not
+
+    def read_grammar_rules(self, grammar_filename):
+        EarleyParser.read_grammar_rules(self, grammar_filename)
+        grammar = self.grammar
+        self.state_rules = [[] for x in range(0, grammar.num_states)]
+        for state in range(0, grammar.num_states):
+            rule_index = grammar.state_rule[state]
+            if rule_index == NO_RULE:
+                continue
+            x = state # the rule passes through every state from here up to its l.h.s.' root
+            while x >= 0:
+                self.state_rules[x].append(rule_index)
+                x = grammar.state_parent[x]
+        self.rule_costs = [dict.fromkeys(COSTS, 0.0) for x in range(0, self.num_rules)]
+        self.state_costs = {}
+
+    # Charges an amount of a cost to one rule
+    def charge_rule(self, rule_index, cost, amount):
+        self.rule_costs[rule_index][cost] += amount
+
+    # Charges an amount of a cost to a trie state, i.e. evenly to every rule that passes through it
+    def charge_state(self, state, cost, amount):
+        if state not in self.state_costs:
+            self.state_costs[state] = dict.fromkeys(COSTS, 0.0)
+        self.state_costs[state][cost] += amount
+
+    # Returns the total costs so far as a pair of lists of dictionaries from cost name to total: one per rule
+    # index and one per l.h.s. symbol id. Work charged to a rule is also charged to its l.h.s.
+    def costs(self):
+        rule_costs = [dict(costs) for costs in self.rule_costs]
+        for state, costs in self.state_costs.items():
+            rules = self.state_rules[state]
+            for rule_index in rules:
+                for cost in COSTS:
+                    rule_costs[rule_index][cost] += costs[cost] / len(rules)
+        lhs_costs = [dict.fromkeys(COSTS, 0.0) for x in range(0, self.grammar.num_nonterminals)]
+        for rule_index in range(0, self.num_rules):
+            for cost in COSTS:
+                lhs_costs[self.grammar.rule_lhs_ids[rule_index]][cost] += rule_costs[rule_index][cost]
+        return rule_costs, lhs_costs
+
+    def predictor(self, i_row, i_col, next_cat):
+        start = time.perf_counter()
+        EarleyParser.predictor(self, i_row, i_col, next_cat)
+        self.charge_state(next_cat, "seconds", time.perf_counter() - start) # the root state of next_cat's rules
+
+    def scanner(self, i_row, i_col, word):
+        start = time.perf_counter()
+        EarleyParser.scanner(self, i_row, i_col, word)
+        self.charge_state(self.chart.columns[i_col].rule_index[i_row], "seconds", time.perf_counter() - start)
+
+    def attach_as(self, match_seeking, state_weight, entry, chain, icol2, i_col):
+        if chain == NO_CHAIN:
+            rule_index = self.grammar.state_rule[self.chart.entry(entry)[0]]
+        else:
+            rule_index = self.grammar.unary_chains[chain][0] # the unary rule whose l.h.s. is match_seeking
+        customers = self.waiting[icol2].get(match_seeking, [])
+        num_customers = len(customers)
+        num_enqueued = self.num_enqueued
+        start = time.perf_counter()
+        EarleyParser.attach_as(self, match_seeking, state_weight, entry, chain, icol2, i_col)
+        self.charge_rule(rule_index, "seconds", time.perf_counter() - start)
+        self.charge_rule(rule_index, "customers", num_customers)
+        # (a customer advanced to a state already in the chart at a lower weight is not counted as a match)
+        self.charge_rule(rule_index, "matches", self.num_enqueued - num_enqueued)
+
+    def finalize(self, tuple_version_of_state, order):
+        row = EarleyParser.finalize(self, tuple_version_of_state, order)
+        if row is not None:
+            self.charge_state(tuple_version_of_state[0], "items", 1)
+        return row
+
+    def parse(self, sentence):
+        start = time.perf_counter()
+        EarleyParser.parse(self, sentence)
+        self.parse_seconds += time.perf_counter() - start
+        self.num_sentences += 1
+
+
+# Returns the rows of a cost table (a list of dictionaries, one per rule or l.h.s.) as (index, costs),
+# most expensive first by the given cost, leaving out the ones that cost nothing at all
+def ranked(costs, sort_by):
+    rows = [(index, costs[index]) for index in range(0, len(costs)) if costs[index]["items"] > 0 or
+            costs[index]["customers"] > 0 or costs[index]["seconds"] > 0]
+    rows.sort(key=lambda row: row[1][sort_by], reverse=True)
+    return rows
+
+# Returns the cells of one line of the report for the given costs, with each one's share of the total
+def cost_cells(costs, totals):
+    cells = []
+    for cost in COSTS:
+        share = 100.0 * costs[cost] / totals[cost] if totals[cost] > 0 else 0.0
+        if cost == "seconds":
+            cells.append("%.3f" % costs[cost] + " (" + "%.1f" % share + "%)")
+        else:
+            cells.append("%.0f" % costs[cost] + " (" + "%.1f" % share + "%)")
+    return cells
+
+# Prints one line of the report
+def print_row(columns):
+    widths = [6, 20, 20, 20, 20, 0]
+    print("".join([str(columns[i]).ljust(widths[i]) for i in range(0, len(columns))]).rstrip())
+
+# This function prints the report: the totals, then the top rules and l.h.s. symbols by the given cost
+def print_report(parser, sort_by, top):
+    rule_costs, lhs_costs = parser.costs()
+    totals = dict.fromkeys(COSTS, 0.0)
+    for costs in lhs_costs:
+        for cost in COSTS:
+            totals[cost] += costs[cost]
+    print("sentences: " + str(parser.num_sentences) + ", parse time: " + "%.3f" % parser.parse_seconds +
+          " s, of which charged to rules: " + "%.3f" % totals["seconds"] + " s")
+    print("")
+    print("top " + str(top) + " rules by " + sort_by)
+    print_row(["rank", "items", "customers", "matches", "seconds", "rule"])
+    rows = ranked(rule_costs, sort_by)
+    for rank in range(0, min(top, len(rows))):
+        rule_index, costs = rows[rank]
+        print_row([rank + 1] + cost_cells(costs, totals) +
+                  ["#" + str(rule_index) + "  " + parser.grammar_rules[rule_index].to_string()])
+    print("")
+    print("top " + str(top) + " l.h.s. symbols by " + sort_by)
+    print_row(["rank", "items", "customers", "matches", "seconds", "l.h.s. (rules)"])
+    rows = ranked(lhs_costs, sort_by)
+    for rank in range(0, min(top, len(rows))):
+        lhs, costs = rows[rank]
+        print_row([rank + 1] + cost_cells(costs, totals) +
+                  [parser.grammar.symbols[lhs] + " (" + str(len(parser.grammar.rules_by_lhs_id[lhs])) + ")"])
+
+# Returns every nonzero cost of the profile as a dictionary, ready for json.dumps()
+def profile_to_dict(parser):
+    rule_costs, lhs_costs = parser.costs()
+    rules = []
+    for rule_index, costs in ranked(rule_costs, "seconds"):
+        record = {"rule": rule_index, "text": parser.grammar_rules[rule_index].to_string()}
+        record.update(costs)
+        rules.append(record)
+    symbols = []
+    for lhs, costs in ranked(lhs_costs, "seconds"):
+        record = {"lhs": parser.grammar.symbols[lhs], "num_rules": len(parser.grammar.rules_by_lhs_id[lhs])}
+        record.update(costs)
+        symbols.append(record)
+    return {"sentences": parser.num_sentences, "parse_seconds": parser.parse_seconds, "rules": rules,
+            "lhs": symbols}
+
+
+# This main function coordinates all the code to run
+def main():
+    arg_parser = argparse.ArgumentParser(
+        usage="%(prog)s grammar.gr sentences.sen [--sort COST] [--top N] [--json FILE] [budget options] "
+              "[beam options]")
+    arg_parser.add_argument("grammar_filename")
+    arg_parser.add_argument("sentences_filename")
+    arg_parser.add_argument("--sort", choices=COSTS, default="seconds",
+                            help="rank rules and l.h.s. symbols by this cost (default: seconds)")
+    arg_parser.add_argument("--top", type=int, default=30, help="how many of each to report (default: 30)")
+    arg_parser.add_argument("--json", dest="json_filename", default=None,
+                            help="also write the costs of every rule and l.h.s. that cost anything to this file")
+    parse.add_budget_arguments(arg_parser)
+    parse.add_beam_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    parser = ProfilingEarleyParser()
+    parser.read_grammar_rules(args.grammar_filename)
+    parser.budget = parse.budget_from_arguments(args)
+    parser.beam = parse.beam_from_arguments(args)
+    with open(args.sentences_filename) as sen_file:
+        sentences = [sentence for sentence in sen_file if len(sentence.strip()) > 0]
+    for index in range(0, len(sentences)):
+        parser.parse(sentences[index])
+        if parser.status != PARSE_OK:
+            print("sentence " + str(index + 1) + ": " + parser.status, file=sys.stderr)
+
+    print_report(parser, args.sort, args.top)
+    if args.json_filename is not None:
+        with open(args.json_filename, "w") as json_file:
+            json.dump(profile_to_dict(parser), json_file, indent=1)
+
+if __name__ == "__main__":
+    main() # starts execution
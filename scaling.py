@@ -0,0 +1,350 @@
+'''
+Authors: Aaron Mueller, Andrew Blair-Stanek
+Date: 24 October 2018
+Course: Natural Language Processing
+Instructor: Jason Eisner
+Assignment: HW4 -- Parsing
+'''
+# Synthetic scaling benchmark: how the parsers' time and chart size grow with sentence length.
+#
+# The shipped sentences are short. This module samples sentences of an exact length from any .GR grammar,
+# and also writes pathological grammars of its own:
+#     ambiguous   S -> S S | x   (Catalan-many trees per sentence, like the + and * of arith.gr)
+#     left        L -> L a | a   (one tree, left-recursive all the way down)
+#     right       R -> a R | a   (one tree, right-recursive all the way down)
+# The runner parses sentences of increasing length with each engine of bench.py, each (engine, grammar,
+# length) in a fresh process, and prints the mean time and chart items per length together with the
+# growth exponent between consecutive lengths (2.9 means time went up like length^2.9 there), so cubic
+# blowups and regressions show up as numbers. An engine that takes more than --max-seconds per sentence
+# at some length is not run on the longer ones.
+#
+#     python scaling.py                                              the pathological grammars, every engine
+#     python scaling.py --grammars arith.gr left --engines parse cky --lengths 10 20 40 80
+#     python scaling.py --sample wallstreet.gr --lengths 15 --samples 5      just print sampled sentences
+#
+# Sampling conditions on the length: inside[A][n] is the probability that A rewrites as exactly n words
+# (summed over all such strings), worked out for every n up to the longest length asked for. A rule is then
+# chosen in proportion to its probability times the probability that its r.h.s. yields n words, and the n
+# words are split among the r.h.s. symbols in the same way. Rules with an empty r.h.s. are not supported.
+# These probabilities underflow long before 1500 words (0.5 ** 1500 is 0 in floating point), so all those for
+# n words are kept scaled by a power of 2 shared by that length; a choice only compares products that cover
+# the same number of words, so it just needs their powers lined up.
+
+import os
+import sys
+import io
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+import resource
+import contextlib
+import multiprocessing
+from grammar import read_grammar_triples
+from bench import ENGINES, chart_items
+
+# The pathological grammars: name -> text of the .GR file
+PATHOLOGICAL_GRAMMARS = {
+    "ambiguous": "1\tROOT\tS\n0.5\tS\tS S\n0.5\tS\tx\n",
+    "left": "1\tROOT\tL\n0.5\tL\tL a\n0.5\tL\ta\n",
+    "right": "1\tROOT\tR\n0.5\tR\ta R\n0.5\tR\ta\n",
+}
+
+DEFAULT_LENGTHS = [5, 10, 20, 40, 80]
+
+# How many rounds the probabilities of unary rules (A -> B over the same words) are propagated per length,
+# at most; they stop as soon as nothing changes by more than UNARY_TOLERANCE
+MAX_UNARY_ROUNDS = 1000
+UNARY_TOLERANCE = 1e-12
+
+# This class samples sentences of a given length from a grammar, given as (prob, lhs, rhs) triples.
+# A symbol is a nonterminal if some rule has it as its l.h.s., and a terminal otherwise.
+class LengthSampler:
+    def __init__(self, triples, max_length):
+        self.max_length = max_length
+        self.rules = [(prob, lhs, rhs) for prob, lhs, rhs in triples]
+        self.rules_for = {} # dictionary (i.e. hash table) from l.h.s. to the indices of its rules
+        for i_rule in range(0, len(self.rules)):
+            if len(self.rules[i_rule][2]) == 0:
+                raise ValueError("rules with an empty r.h.s. are not supported: " + self.rules[i_rule][1])
+            self.rules_for.setdefault(self.rules[i_rule][1], []).append(i_rule)
+
+        self.inside = {} # nonterminal -> list of the probabilities of yielding 0, 1, ..., max_length words
+        self.exponents = [0] * (max_length + 1) # n -> the power of 2 that all the probabilities for n words
+                                                # are divided by
+        for lhs in self.rules_for:
+            self.inside[lhs] = [0.0] * (max_length + 1)
+        # suffix[i_rule][i][n] is the probability that rhs[i:] of the rule yields exactly n words (for i up to
+        # the last symbol, whose suffix is just its inside probabilities and is not stored)
+        self.suffix = [[[0.0] * (max_length + 1) for i in range(0, len(rhs) - 1)] for prob, lhs, rhs in self.rules]
+        for n in range(1, max_length + 1):
+            self.fill_length(n)
+
+    # Returns the probability that a symbol yields exactly n words (divided by 2 ** exponents[n])
+    def symbol_inside(self, symbol, n):
+        if symbol in self.inside:
+            return self.inside[symbol][n]
+        return math.ldexp(1.0, -self.exponents[1]) if n == 1 else 0.0
+
+    # Returns the product of two probabilities, for left and right words (so divided by 2 ** exponents[left]
+    # and 2 ** exponents[right]), divided by 2 ** exponent instead
+    def product(self, x, left, y, right, exponent):
+        return math.ldexp(x * y, self.exponents[left] + self.exponents[right] - exponent)
+
+    # Returns the probability that the r.h.s. of a rule, from its i-th symbol on, yields exactly n words
+    # (divided by 2 ** exponents[n])
+    def rhs_inside(self, i_rule, i, n):
+        rhs = self.rules[i_rule][2]
+        if i == len(rhs) - 1:
+            return self.symbol_inside(rhs[i], n)
+        return self.suffix[i_rule][i][n]
+
+    # This function works out the inside probabilities of every nonterminal for n words. Every symbol yields at
+    # least one word, so a rule with two or more r.h.s. symbols only needs shorter lengths, which are done
+    # already; the rules with a single nonterminal on the r.h.s. are propagated until nothing changes. Then
+    # exponents[n] is chosen so that the largest of them is between 0.5 and 1.
+    def fill_length(self, n):
+        if n > 1:
+            self.exponents[n] = max([self.exponents[x] + self.exponents[n - x] for x in range(1, n)])
+        for i_rule in range(0, len(self.rules)):
+            rhs = self.rules[i_rule][2]
+            for i in range(len(rhs) - 2, -1, -1):
+                total = 0.0
+                for length in range(1, n - (len(rhs) - 1 - i) + 1):
+                    total += self.product(self.symbol_inside(rhs[i], length), length,
+                                          self.rhs_inside(i_rule, i + 1, n - length), n - length, self.exponents[n])
+                self.suffix[i_rule][i][n] = total
+
+        unary_rules = []
+        for lhs in self.inside:
+            total = 0.0
+            for i_rule in self.rules_for[lhs]:
+                prob, rhs = self.rules[i_rule][0], self.rules[i_rule][2]
+                if len(rhs) == 1 and rhs[0] in self.inside:
+                    unary_rules.append(i_rule)
+                else:
+                    total += prob * self.rhs_inside(i_rule, 0, n)
+            self.inside[lhs][n] = total
+        base = dict([(lhs, self.inside[lhs][n]) for lhs in self.inside])
+        for x in range(0, MAX_UNARY_ROUNDS):
+            if len(unary_rules) == 0:
+                break
+            new = dict(base)
+            for i_rule in unary_rules:
+                prob, lhs, rhs = self.rules[i_rule]
+                new[lhs] += prob * self.inside[rhs[0]][n]
+            change = max([abs(new[lhs] - self.inside[lhs][n]) for lhs in new])
+            for lhs in new:
+                self.inside[lhs][n] = new[lhs]
+            if change <= UNARY_TOLERANCE * max(1e-300, max(new.values())):
+                break
+
+        largest = max([self.inside[lhs][n] for lhs in self.inside] +
+                      [suffixes[i][n] for suffixes in self.suffix for i in range(0, len(suffixes))])
+        if largest == 0:
+            return
+        shift = math.frexp(largest)[1]
+        self.exponents[n] += shift
+        for lhs in self.inside:
+            self.inside[lhs][n] = math.ldexp(self.inside[lhs][n], -shift)
+        for suffixes in self.suffix:
+            for i in range(0, len(suffixes)):
+                suffixes[i][n] = math.ldexp(suffixes[i][n], -shift)
+
+    # Returns a random element of choices (a list of (weight, choice)), chosen in proportion to its weight
+    def choose(self, rng, choices):
+        target = rng.random() * sum([weight for weight, choice in choices])
+        for weight, choice in choices:
+            target -= weight
+            if target < 0 and weight > 0:
+                return choice
+        return [choice for weight, choice in choices if weight > 0][-1] # only reached through rounding
+
+    # Returns a list of exactly n words sampled from the grammar, starting at ROOT, or raises ValueError if the
+    # grammar has no sentence of that length. The tree is expanded with a stack instead of recursion, so deep
+    # (left- or right-recursive) derivations of long sentences do not hit Python's recursion limit.
+    def sample(self, rng, n, start = "ROOT"):
+        if n < 1 or n > self.max_length:
+            raise ValueError("the length must be between 1 and " + str(self.max_length))
+        if self.symbol_inside(start, n) == 0:
+            raise ValueError(start + " has no sentence of " + str(n) + " words")
+        words = []
+        stack = [(start, n)] # (symbol, number of words it must yield), the next one to expand on top
+        while len(stack) > 0:
+            symbol, length = stack.pop()
+            if symbol not in self.inside:
+                words.append(symbol)
+                continue
+            choices = []
+            for i_rule in self.rules_for[symbol]:
+                choices.append((self.rules[i_rule][0] * self.rhs_inside(i_rule, 0, length), i_rule))
+            i_rule = self.choose(rng, choices)
+
+            # split the words among the r.h.s. symbols, from left to right
+            rhs = self.rules[i_rule][2]
+            parts = []
+            for i in range(0, len(rhs) - 1):
+                choices = []
+                for part in range(1, length - (len(rhs) - 1 - i) + 1):
+                    choices.append((self.product(self.symbol_inside(rhs[i], part), part,
+                                                 self.rhs_inside(i_rule, i + 1, length - part), length - part,
+                                                 self.exponents[length]), part))
+                part = self.choose(rng, choices)
+                parts.append((rhs[i], part))
+                length -= part
+            parts.append((rhs[-1], length))
+            parts.reverse()
+            stack.extend(parts)
+        return words
+
+
+# Returns the (prob, lhs, rhs) triples of a grammar given as a .GR filename or as a pathological grammar's name
+def grammar_triples(grammar):
+    if grammar in PATHOLOGICAL_GRAMMARS:
+        return read_grammar_triples(PATHOLOGICAL_GRAMMARS[grammar])
+    with open(grammar) as infile:
+        return read_grammar_triples(infile.read())
+
+# Writes the pathological grammars as .GR files into a directory and returns a dictionary from their names
+# to the files' names
+def write_pathological_grammars(directory):
+    filenames = {}
+    for name in PATHOLOGICAL_GRAMMARS:
+        filenames[name] = os.path.join(directory, name + ".gr")
+        with open(filenames[name], "w") as outfile:
+            outfile.write(PATHOLOGICAL_GRAMMARS[name])
+    return filenames
+
+# This function does one run (an engine on the sentences of one length) and returns its measurements.
+# It runs in its own process.
+def run_scaling(job):
+    engine, grammar, grammar_filename, length, sentences = job
+    module_name, class_name = ENGINES[engine]
+    parser = getattr(__import__(module_name), class_name)()
+    parser.read_grammar_rules(grammar_filename)
+
+    latencies = []
+    items = []
+    for sentence in sentences:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            parser.parse(sentence)
+            parser.print()
+        latencies.append(time.perf_counter() - start)
+        items.append(chart_items(parser))
+    return {"engine": engine, "grammar": grammar, "length": length, "latencies": latencies, "chart_items": items,
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+# Returns the mean of a list of numbers, or None if it is empty (or holds a None)
+def mean(values):
+    if len(values) == 0 or None in values:
+        return None
+    return sum(values) / float(len(values))
+
+# Returns the growth exponent between two (length, value) points: value grows like length^exponent there
+def exponent(previous, current):
+    if previous is None or previous[1] is None or current[1] is None or previous[1] <= 0 or current[1] <= 0:
+        return None
+    return math.log(current[1] / previous[1]) / math.log(current[0] / float(previous[0]))
+
+# Returns a number formatted for the table, or "-" for None
+def cell(value, fmt):
+    return "-" if value is None else fmt % value
+
+# Prints one line of the results table
+def print_row(columns):
+    widths = [16, 16, 8, 11, 7, 11, 7, 9, 0]
+    print("".join([str(columns[i]).ljust(widths[i]) for i in range(0, len(columns))]).rstrip())
+
+
+# This main function coordinates all the code to run
+def main():
+    arg_parser = argparse.ArgumentParser(
+        usage="%(prog)s [--grammars G ...] [--engines E ...] [--lengths N ...] [--samples S] [--seed SEED] "
+              "[--max-seconds T] [--json FILE] | --sample G [--lengths N ...] | --write-grammars DIR")
+    arg_parser.add_argument("--grammars", nargs="+", default=list(PATHOLOGICAL_GRAMMARS.keys()),
+                            help=".GR files and/or names of pathological grammars (" +
+                                 ", ".join(PATHOLOGICAL_GRAMMARS.keys()) + ")")
+    arg_parser.add_argument("--engines", nargs="+", choices=list(ENGINES.keys()), default=list(ENGINES.keys()))
+    arg_parser.add_argument("--lengths", nargs="+", type=int, default=DEFAULT_LENGTHS)
+    arg_parser.add_argument("--samples", type=int, default=3, help="sentences per length (default: 3)")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--max-seconds", type=float, default=10.0,
+                            help="stop giving an engine longer sentences once its mean time per sentence "
+                                 "goes over this (default: 10)")
+    arg_parser.add_argument("--json", dest="json_filename", default=None,
+                            help="also write every measurement (including per-sentence latencies) to this file")
+    arg_parser.add_argument("--sample", dest="sample_grammar", default=None,
+                            help="only print --samples sentences of each length sampled from this grammar")
+    arg_parser.add_argument("--write-grammars", dest="grammar_directory", default=None,
+                            help="only write the pathological grammars as .GR files into this directory")
+    args = arg_parser.parse_args()
+    lengths = sorted(set(args.lengths))
+    if lengths[0] < 1:
+        arg_parser.error("lengths must be at least 1")
+
+    if args.grammar_directory is not None:
+        for name, filename in write_pathological_grammars(args.grammar_directory).items():
+            print(filename)
+        return
+
+    rng = random.Random(args.seed)
+    if args.sample_grammar is not None:
+        sampler = LengthSampler(grammar_triples(args.sample_grammar), lengths[-1])
+        for length in lengths:
+            for x in range(0, args.samples):
+                print(" ".join(sampler.sample(rng, length)))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        grammar_filenames = write_pathological_grammars(directory)
+        jobs = {} # (grammar, length) -> sampled sentences, shared by all the engines
+        for grammar in args.grammars:
+            if grammar not in PATHOLOGICAL_GRAMMARS and not os.path.exists(grammar):
+                arg_parser.error("no such grammar file or pathological grammar: " + grammar)
+            grammar_filenames.setdefault(grammar, grammar)
+            sampler = LengthSampler(grammar_triples(grammar), lengths[-1])
+            for length in lengths:
+                try:
+                    jobs[(grammar, length)] = [" ".join(sampler.sample(rng, length)) for x in range(0, args.samples)]
+                except ValueError as error:
+                    print(grammar + ": " + str(error))
+
+        results = []
+        print_row(["grammar", "engine", "length", "mean ms", "growth", "items", "growth", "peak MB", "note"])
+        with multiprocessing.Pool(1, maxtasksperchild=1) as pool: # a fresh process per run
+            for grammar in args.grammars:
+                for engine in args.engines:
+                    previous = None # (length, mean seconds, mean items) of the last length run
+                    for length in lengths:
+                        if (grammar, length) not in jobs:
+                            continue
+                        if previous is not None and previous[1] > args.max_seconds:
+                            print_row([grammar, engine, length, "-", "-", "-", "-", "-", "skipped (too slow)"])
+                            continue
+                        result = pool.apply(run_scaling, ((engine, grammar, grammar_filenames[grammar], length,
+                                                           jobs[(grammar, length)]),))
+                        seconds = mean(result["latencies"])
+                        items = mean(result["chart_items"])
+                        time_growth = exponent(None if previous is None else (previous[0], previous[1]),
+                                               (length, seconds))
+                        items_growth = exponent(None if previous is None else (previous[0], previous[2]),
+                                                (length, items))
+                        print_row([grammar, engine, length, "%.2f" % (1000 * seconds), cell(time_growth, "%.2f"),
+                                   cell(items, "%.0f"), cell(items_growth, "%.2f"),
+                                   "%.1f" % (result["peak_rss_kb"] / 1024.0), ""])
+                        sys.stdout.flush()
+                        result["sentences"] = jobs[(grammar, length)]
+                        result["time_growth"] = time_growth
+                        result["items_growth"] = items_growth
+                        results.append(result)
+                        previous = (length, seconds, items)
+
+    if args.json_filename is not None:
+        with open(args.json_filename, "w") as json_file:
+            json.dump(results, json_file, indent=1)
+
+if __name__ == "__main__":
+    main() # starts execution
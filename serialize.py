@@ -0,0 +1,161 @@
+'''
+Authors: Aaron Mueller, Andrew Blair-Stanek
+Date: 24 October 2018
+Course: Natural Language Processing
+Instructor: Jason Eisner
+Assignment: HW4 -- Parsing
+'''
+# Iterative tree serialization for parse.py (choose the format with  parse.py --format F).
+#
+# A tree is first walked into a list of events, without recursion (deep Wall Street trees would hit Python's
+# recursion limit): (OPEN, label) when a constituent starts, (WORD, word) for a word and (CLOSE, None) when
+# a constituent ends. Each output format is then built from the events into a single string:
+#     bracket   (S (NP Papa )(VP ...))  followed by the weight on the next line, as parse.py always printed
+#     json      {"status":"OK","weight":10.2,"tree":["S",["NP","Papa"],["VP",...]]}  on one line (the nested
+#               lists are written straight from the events, so a tree of any depth can be written)
+#     flat      {"status":"OK","weight":10.2,"labels":["S","NP","Papa",...],"parents":[-1,0,1,...]}  on one
+#               line: the constituents and words in preorder, each with the index of its parent
+# A sentence without a parse is  NONE  (or TIMEOUT, OVER BUDGET) in bracket format, and has a null weight
+# and tree with that status in the other formats.
+# With  parse.py -k N,  each sentence's output is still one group, so that the sentences can be told apart:
+# in bracket format a line  K-BEST n  (the number of trees that follow) and then each tree as above, and in
+# the other formats a single record {"status":"OK","trees":[...]} whose list holds each tree's record (rank,
+# weight and tree), best first. A sentence without a parse has its usual status line, or an empty list.
+
+import json
+from chart import NO_CHAIN
+
+# The kinds of events
+OPEN = 0
+WORD = 1
+CLOSE = 2
+
+FORMATS = ("bracket", "json", "flat")
+
+# This function walks a tree into events and returns them with the tree's weight.
+# The tree is given by its root node (a unary chain of parser.grammar may be wrapped around it) and by
+# expand(node), which returns (gr_rule, children): the rule at the node, and one child per r.h.s. symbol,
+# either a pair (node, chain) or None for a terminal. As in parse.py, a rule's weight comes first in the sum
+# of a subtree's weight, then its children's from left to right, then the weights of the unary chain around it.
+def tree_events(parser, root, chain, expand):
+    events = []
+    stack = [] # per open constituent: [weight so far, gr_rule, children, index of next child, chain]
+
+    def open_node(node, chain):
+        if chain != NO_CHAIN:
+            for i_rule in parser.grammar.unary_chains[chain]:
+                events.append((OPEN, parser.grammar_rules[i_rule].lhs))
+        gr_rule, children = expand(node)
+        events.append((OPEN, gr_rule.lhs))
+        stack.append([gr_rule.weight, gr_rule, children, 0, chain])
+
+    open_node(root, chain)
+    weight = 0.0
+    while len(stack) > 0:
+        frame = stack[-1]
+        gr_rule, children, index = frame[1], frame[2], frame[3]
+        if index < len(children):
+            frame[3] = index + 1
+            if children[index] is None:
+                events.append((WORD, gr_rule.rhs[index]))
+            else:
+                open_node(children[index][0], children[index][1])
+            continue
+
+        stack.pop()
+        events.append((CLOSE, None))
+        weight, chain = frame[0], frame[4]
+        if chain != NO_CHAIN:
+            events.extend([(CLOSE, None)] * len(parser.grammar.unary_chains[chain]))
+            weight = parser.chain_weight(chain, weight)
+        if len(stack) > 0:
+            stack[-1][0] += weight
+    return events, weight
+
+# Returns the tree of a list of events in the bracket format of parse.py, e.g. (S (NP Papa )(VP ...))
+def to_bracket(events):
+    parts = []
+    for kind, text in events:
+        if kind == OPEN:
+            parts.append("(" + text + " ")
+        elif kind == WORD:
+            parts.append(text + " ")
+        else:
+            parts.append(")")
+    return "".join(parts)
+
+# Returns the tree of a list of events as the JSON text of nested lists: [label, child, child, ...] where a word
+# is a string. Only the labels and words go through json.dumps(); calling it on the nested lists themselves
+# would recurse once per level of the tree, and fail on very deep trees.
+def to_json(events):
+    parts = []
+    first = True # whether the next item is the first of its list (so no comma goes before it)
+    for kind, text in events:
+        if kind == CLOSE:
+            parts.append("]")
+        else:
+            if not first:
+                parts.append(",")
+            if kind == OPEN:
+                parts.append("[")
+            parts.append(json.dumps(text))
+        first = False
+    return "".join(parts)
+
+# Returns the tree of a list of events as parallel lists (labels, parents), in preorder
+def to_flat(events):
+    labels = []
+    parents = []
+    open_nodes = [-1] # indices of the constituents containing the current position
+    for kind, text in events:
+        if kind == CLOSE:
+            open_nodes.pop()
+            continue
+        labels.append(text)
+        parents.append(open_nodes[-1])
+        if kind == OPEN:
+            open_nodes.append(len(labels) - 1)
+    return labels, parents
+
+# Returns the JSON record of a tree (as a list of events), as text: the given fields (a dictionary) followed
+# by the tree, as "tree" in json format or "labels" and "parents" in flat format
+def tree_record(fields, events, output_format):
+    if output_format == "json":
+        text = json.dumps(fields, separators=(",", ":"))
+        return text[:-1] + ',"tree":' + to_json(events) + "}" # (the tree goes in before the closing brace)
+    fields["labels"], fields["parents"] = to_flat(events)
+    return json.dumps(fields, separators=(",", ":"))
+
+# Returns the output for one tree (as a list of events) and its weight, in the given format, ending in a newline
+def format_tree(events, weight, output_format):
+    if output_format == "bracket":
+        return to_bracket(events) + "\n" + str(weight) + "\n"
+    return tree_record({"status": "OK", "weight": weight}, events, output_format) + "\n"
+
+# Returns the output for the k best trees of a sentence, as a list of (events, weight) pairs (best first),
+# in the given format, ending in a newline
+def format_trees(trees, output_format):
+    if len(trees) == 0:
+        return format_failure("NONE", output_format, True)
+    if output_format == "bracket":
+        return "K-BEST " + str(len(trees)) + "\n" + \
+            "".join([format_tree(events, weight, output_format) for events, weight in trees])
+    records = []
+    for rank in range(0, len(trees)):
+        events, weight = trees[rank]
+        records.append(tree_record({"rank": rank + 1, "weight": weight}, events, output_format))
+    return '{"status":"OK","trees":[' + ",".join(records) + "]}\n"
+
+# Returns the output for a sentence without a tree (status is NONE, TIMEOUT or OVER BUDGET) in the given format.
+# With k_best, it is in the form of format_trees(), with an empty list of trees.
+def format_failure(status, output_format, k_best = False):
+    if output_format == "bracket":
+        return status + "\n"
+    if k_best:
+        return json.dumps({"status": status, "trees": []}, separators=(",", ":")) + "\n"
+    result = {"status": status, "weight": None}
+    if output_format == "json":
+        result["tree"] = None
+    else:
+        result["labels"], result["parents"] = None, None
+    return json.dumps(result, separators=(",", ":")) + "\n"
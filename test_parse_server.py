@@ -0,0 +1,60 @@
+'''
+Authors: Aaron Mueller, Andrew Blair-Stanek
+Date: 24 October 2018
+Course: Natural Language Processing
+Instructor: Jason Eisner
+Assignment: HW4 -- Parsing
+'''
+# Smoke test for parse_server.py: starts a server on a Unix socket, sends it sentences and checks that it
+# answers exactly what parse.py prints for them. (The server turns any exception in a worker into ERROR, so
+# a change to parse_batch_job() that breaks the server would otherwise go unnoticed.)
+#
+#     python -m unittest test_parse_server
+
+import os
+import io
+import asyncio
+import tempfile
+import unittest
+import contextlib
+from parse import EarleyParser
+from parse_server import ParseServer
+
+# This function returns what parse.py prints for a sentence
+def expected_output(grammar_filename, sentence):
+    parser = EarleyParser()
+    parser.read_grammar_rules(grammar_filename)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        parser.parse(sentence)
+        parser.print()
+    return output.getvalue()
+
+# This function starts a server, sends it the sentences (one per line) over a Unix socket and returns
+# everything it sends back once the client has closed its end
+async def ask_server(grammar_filename, sentences):
+    server = ParseServer(grammar_filename, 1, 4)
+    try:
+        await server.warm_up()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "parse.sock")
+            listener = await asyncio.start_unix_server(server.handle_client, path=path)
+            async with listener:
+                reader, writer = await asyncio.open_unix_connection(path)
+                writer.write("".join([sentence + "\n" for sentence in sentences]).encode("utf-8"))
+                writer.write_eof()
+                response = await asyncio.wait_for(reader.read(), 60)
+                writer.close()
+    finally:
+        server.pool.shutdown()
+    return response.decode("utf-8")
+
+
+class ParseServerTest(unittest.TestCase):
+    def test_answers_like_parse_py(self):
+        sentences = ["Papa ate the caviar with a spoon", "Papa ate"]
+        expected = "".join([expected_output("papa.gr", sentence) for sentence in sentences])
+        self.assertEqual(asyncio.run(ask_server("papa.gr", sentences)), expected)
+
+if __name__ == "__main__":
+    unittest.main()